@@ -0,0 +1,134 @@
+"""
+    grant or revoke a qualification type for many workers
+"""
+
+from helpers import (set_logging_configs, make_mtc, get_worker_count,
+                     iter_workers_with_qualification_type)
+from engine import ThrottledClient, run_concurrently
+from qualification_cache import QualificationCache
+
+
+def read_worker_ids(file_path):
+    with open(file_path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def get_project_worker_ids(project_name, account, host, status=None):
+    """ The WorkerIds in the results store of a previous project. """
+    from results_store import open_project_store
+
+    store = open_project_store(project_name, account, host)
+    worker_ids = {assignment['WorkerId'] for assignment in store.get_assignments(status=status)}
+    store.close()
+    return sorted(worker_ids)
+
+
+def assign_qualification(mtc, qt_id, worker_ids, action='associate', value=1,
+                         dry_run=False, max_workers=8, rate=5.):
+    """ Associate a qualification type with workers, or disassociate it from them.
+
+    The current members are listed once, so workers who already hold the
+    qualification (or, to disassociate, who do not) are skipped without a call.
+
+    Returns:
+        summary(dict): The counts of requested, skipped, succeeded and failed
+            workers, and the error of every failure.
+    """
+    mtc = ThrottledClient(mtc, rate=rate)
+    members = {qualification['WorkerId'] for qualification in
+               iter_workers_with_qualification_type(mtc, qt_id, status='Granted')}
+
+    worker_ids = list(dict.fromkeys(worker_ids))
+    if action == 'associate':
+        todo = [w for w in worker_ids if w not in members]
+        def call(WorkerId):
+            return mtc.associate_qualification_with_worker(
+                QualificationTypeId=qt_id, WorkerId=WorkerId,
+                IntegerValue=value, SendNotification=False)
+    elif action == 'disassociate':
+        todo = [w for w in worker_ids if w in members]
+        def call(WorkerId):
+            return mtc.disassociate_qualification_from_worker(
+                QualificationTypeId=qt_id, WorkerId=WorkerId)
+    else:
+        raise RuntimeError('The action "%s" does not exist, please use "associate" or "disassociate".' % action)
+
+    summary = dict(total=len(worker_ids), members=len(members),
+                   skipped=len(worker_ids) - len(todo), succeeded=0, failed=0, failures={})
+    if dry_run:
+        summary['would_run'] = len(todo)
+        return summary
+
+    for WorkerId, result in run_concurrently(call, todo, max_workers=max_workers,
+                                             return_exceptions=True):
+        if isinstance(result, Exception):
+            summary['failed'] += 1
+            summary['failures'][WorkerId] = str(result)
+        else:
+            summary['succeeded'] += 1
+    return summary
+
+
+def get_summary_review(qt_id, action, summary):
+    review = ('\n%s qualification %s\n' % (action.capitalize(), qt_id) +
+              '  Current members : %d\n' % summary['members'] +
+              '  Workers         : %d\n' % summary['total'] +
+              '  Skipped         : %d\n' % summary['skipped'])
+    if 'would_run' in summary:
+        return review + '  Dry run         : %d would be sent\n' % summary['would_run']
+
+    review += ('  Succeeded       : %d\n' % summary['succeeded'] +
+               '  Failed          : %d\n' % summary['failed'])
+    for WorkerId, error in summary['failures'].items():
+        review += '    %s : %s\n' % (WorkerId, error)
+    return review
+
+
+if __name__ == '__main__':
+    import argparse
+
+    # create parser object
+    parser = argparse.ArgumentParser()
+    parser.add_argument('action', choices=['associate', 'disassociate'],
+                        help='Grant or revoke the qualification?')
+    parser.add_argument('--qualification', type=str,
+                        help='Which QualificationTypeId to use?')
+    parser.add_argument('--account', type=str,
+                        help='Which requester account to use?')
+    parser.add_argument('--host', type=str, default='sandbox',
+                        help='Which platform to host, sandbox or formal?')
+    parser.add_argument('--worker_file', type=str,
+                        help='Which file of WorkerIds, one per line, to use?')
+    parser.add_argument('--from_project', type=str,
+                        help='Which previous project to take the WorkerIds of?')
+    parser.add_argument('--status', type=str,
+                        help='Only take workers whose assignment has this status?')
+    parser.add_argument('--value', type=int, default=1,
+                        help='Which IntegerValue to associate?')
+    parser.add_argument('--dry_run', action='store_true',
+                        help='Only report what would be done?')
+    parser.add_argument('--workers', type=get_worker_count, default=8,
+                        help='How many calls to run concurrently?')
+    parser.add_argument('--rate', type=float, default=5.,
+                        help='How many calls per second at most?')
+
+    # parse terminal inputs
+    args = parser.parse_args()
+
+    if args.worker_file:
+        worker_ids = read_worker_ids(args.worker_file)
+    elif args.from_project:
+        worker_ids = get_project_worker_ids(args.from_project, args.account, args.host,
+                                            status=args.status)
+    else:
+        parser.error('either --worker_file or --from_project is required')
+
+    logger = set_logging_configs(__name__)
+    summary = assign_qualification(make_mtc(args.account, args.host), args.qualification,
+                                   worker_ids, action=args.action, value=args.value,
+                                   dry_run=args.dry_run, max_workers=args.workers, rate=args.rate)
+    logger.info(get_summary_review(args.qualification, args.action, summary))
+
+    # the cached worker count of the qualification is stale now
+    if summary['succeeded']:
+        QualificationCache(args.account, args.host).invalidate(args.qualification)
@@ -0,0 +1,92 @@
+"""
+    benchmark the posting path against the fake mturk client
+"""
+
+import os
+import time
+import tempfile
+import tracemalloc
+
+from helpers import get_hit_descriptions, get_hit_setups
+from engine import percentile
+from fake_mtc import FakeMTurkClient
+from journal import CreationJournal
+from post_hits import get_hit_kwargs_builder, post_hit_sets
+
+
+BENCH_INFO = dict(title='Benchmark', description='A benchmark HIT', keywords='benchmark')
+BENCH_SETUP = dict(reward='0.50', max_assignments='3', assignment_duration_in_mins='30',
+                   lifetime_in_hours='24', auto_approval_delay_in_hours='48')
+
+
+def bench_posting(n_sets, latency=0.05, latency_jitter=0.02, throttle_rate=0.02,
+                  failure_rate=0., max_workers=8, rate=None, seed=0):
+    """ Post n_sets HIT sets through post_hit_sets and a fake client.
+
+    Returns:
+        result(dict): The throughput (sets/s), p50/p99 create_hit latency (s),
+            the number of retries, the number of sets that failed after their
+            retries and the peak traced memory (MiB).
+    """
+    mtc = FakeMTurkClient(latency=latency, latency_jitter=latency_jitter,
+                          throttle_rate=throttle_rate, failure_rate=failure_rate, seed=seed)
+    build_hit_kwargs = get_hit_kwargs_builder('benchmark', get_hit_descriptions(BENCH_INFO),
+                                              get_hit_setups(BENCH_SETUP), [])
+
+    with tempfile.TemporaryDirectory() as tmp_path:
+        journal = CreationJournal(os.path.join(tmp_path, 'bench.journal'),
+                                  'benchmark', 'bench', 'fake')
+        journal.start_run()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        failed = []
+        created = post_hit_sets(mtc, journal, range(n_sets), build_hit_kwargs,
+                                max_workers=max_workers, rate=rate,
+                                on_failed=lambda set_id, err: failed.append(set_id))
+        wall_time = time.perf_counter() - start
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    latencies = [hit['Latency'] for hit in created]
+    return dict(n_sets=n_sets, wall_time=wall_time,
+                throughput=n_sets / wall_time,
+                p50=percentile(latencies, 50), p99=percentile(latencies, 99),
+                retries=sum(hit['Retries'] for hit in created),
+                failures=len(failed),
+                peak_memory=peak_memory / 2 ** 20)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    # create parser object
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='*', default=[1, 100, 5000],
+                        help='How many HIT sets to post per benchmark?')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='How many seconds does a fake call take?')
+    parser.add_argument('--jitter', type=float, default=0.02,
+                        help='How many seconds of random latency to add at most?')
+    parser.add_argument('--throttle', type=float, default=0.02,
+                        help='Which fraction of fake calls is throttled?')
+    parser.add_argument('--failure', type=float, default=0.,
+                        help='Which fraction of fake calls fails?')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='How many HITs to create concurrently?')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='How many create_hit calls per second at most, 0 for no limit?')
+
+    # parse terminal inputs
+    args = parser.parse_args()
+
+    print('%8s %10s %12s %10s %10s %8s %8s %12s' % (
+        'sets', 'wall (s)', 'sets/s', 'p50 (ms)', 'p99 (ms)', 'retries', 'failed', 'peak (MiB)'))
+    for n_sets in args.sizes:
+        result = bench_posting(n_sets, latency=args.latency, latency_jitter=args.jitter,
+                               throttle_rate=args.throttle, failure_rate=args.failure,
+                               max_workers=args.workers, rate=args.rate)
+        print('%8d %10.2f %12.1f %10.1f %10.1f %8d %8d %12.2f' % (
+            result['n_sets'], result['wall_time'], result['throughput'],
+            result['p50'] * 1000, result['p99'] * 1000, result['retries'], result['failures'],
+            result['peak_memory']))
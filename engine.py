@@ -0,0 +1,250 @@
+"""
+    concurrent, rate-limited execution of MTurk calls
+"""
+
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import API_METRICS
+
+
+# error codes that MTurk (and botocore) use for request throttling
+THROTTLING_ERROR_CODES = {'Throttling', 'ThrottlingException', 'ThrottledException',
+                          'RequestLimitExceeded', 'TooManyRequestsException'}
+# error codes of server side failures that a later attempt may not hit
+TRANSIENT_ERROR_CODES = {'ServiceFault', 'ServiceUnavailable', 'InternalError', 'InternalFailure',
+                         'RequestTimeout', 'RequestTimeoutException'}
+# botocore's connection errors, named since botocore is only imported with the client
+CONNECTION_ERROR_NAMES = {'HTTPClientError', 'ConnectionError', 'EndpointConnectionError',
+                          'ConnectionClosedError', 'ReadTimeoutError', 'ConnectTimeoutError'}
+
+
+class RateLimiter:
+    """ A thread-safe token bucket.
+
+    Args:
+        rate(float): Tokens added per second. None or 0 disables limiting.
+        burst(int): The bucket size, i.e. the number of calls allowed at once.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate) if rate else 0.
+        self.burst = float(burst or max(1, int(self.rate)))
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst,
+                                   self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def is_throttling_error(err):
+    error = (getattr(err, 'response', None) or {}).get('Error', {})
+    code = error.get('Code', '')
+    message = error.get('Message', '').lower()
+    return code in THROTTLING_ERROR_CODES or ('rate' in message and 'exceeded' in message)
+
+
+def is_transient_error(err):
+    response = getattr(err, 'response', None) or {}
+    if response.get('Error', {}).get('Code', '') in TRANSIENT_ERROR_CODES:
+        return True
+    if response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0) >= 500:
+        return True
+    return (isinstance(err, (ConnectionError, TimeoutError)) or
+            any(cls.__name__ in CONNECTION_ERROR_NAMES for cls in type(err).__mro__))
+
+
+def call_with_retries(func, kwargs, limiter=None, max_retries=6,
+                      base_delay=0.5, max_delay=16., on_retry=None):
+    """ Call func(**kwargs), retrying throttled and transient failures with jittered
+    exponential backoff.
+
+    This is the only retry layer, botocore does not retry. Other errors are
+    raised right away. Calls that create something are only safe to retry
+    with a UniqueRequestToken.
+    """
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return func(**kwargs)
+        except Exception as err:
+            if not (is_throttling_error(err) or is_transient_error(err)) or attempt >= max_retries:
+                raise
+            # "full jitter" backoff
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            attempt += 1
+            # botocore errors name their operation, connection errors do not
+            API_METRICS.record_retry(getattr(err, 'operation_name', None) or
+                                     getattr(func, '__name__', 'unknown'))
+            if on_retry is not None:
+                on_retry(attempt, delay, err)
+            time.sleep(delay)
+
+
+class ThrottledClient:
+    """ Wrap a mturk client so that every call goes through one rate limiter
+    and throttled or transient failures are retried.
+
+    The wrapper can be shared by worker threads, like the client itself. A
+    limiter shared with other calls can be given in place of rate and burst.
+    """
+
+    def __init__(self, mtc, rate=5., burst=None, max_retries=6, limiter=None):
+        self.mtc = mtc
+        self.limiter = limiter or RateLimiter(rate, burst)
+        self.max_retries = max_retries
+
+    def __getattr__(self, name):
+        func = getattr(self.mtc, name)
+        if not callable(func):
+            return func
+
+        def throttled(**kwargs):
+            return call_with_retries(func, kwargs, limiter=self.limiter,
+                                     max_retries=self.max_retries)
+        return throttled
+
+
+def run_concurrently(func, items, max_workers=8, max_pending=None, return_exceptions=False):
+    """ Apply func to every item with a thread pool and yield (item, result) in input order.
+
+    items can be any iterable; at most max_pending calls are queued at a time so
+    that long streams stay in bounded memory. Unless return_exceptions is set,
+    the first error stops the submission of new items and is re-raised.
+    """
+    max_pending = max_pending or max_workers * 4
+    stop = threading.Event()
+
+    def guarded(item):
+        if stop.is_set():
+            return None
+        return func(item)
+
+    items = iter(items)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            while True:
+                while len(pending) < max_pending and not stop.is_set():
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        break
+                    pending.append((item, executor.submit(guarded, item)))
+
+                if not pending:
+                    break
+
+                item, future = pending.popleft()
+                try:
+                    result = future.result()
+                except Exception as err:
+                    if not return_exceptions:
+                        raise
+                    result = err
+                yield item, result
+        except BaseException:
+            stop.set()
+            for _, future in pending:
+                future.cancel()
+            raise
+
+
+def create_hits(mtc, hit_set_ids, build_hit_kwargs, max_workers=8, rate=5., burst=None,
+                max_retries=6, on_created=None, create_func=None, limiter=None, on_failed=None):
+    """ Create one HIT per set with a bounded worker pool.
+
+    Args:
+        mtc: A mturk client.
+        hit_set_ids(iterable): The HSetIds to post.
+        build_hit_kwargs(callable): Returns the create_hit kwargs of a set id.
+        max_workers(int): The number of concurrent create_hit calls.
+        rate(float): The maximum number of create_hit calls per second.
+        burst(int): The token bucket size of the rate limiter.
+        max_retries(int): The number of retries of a throttled or failed call.
+        on_created(callable): Called with each created HIT record, from the worker thread.
+        create_func(callable): Used in place of mtc.create_hit.
+        limiter(RateLimiter): A limiter shared with other calls, in place of rate and burst.
+        on_failed(callable): Called with the set id and the error of each set that
+            failed after its retries; without it the first failure is raised.
+
+    Returns:
+        created(list): One dict per set with its SetId, HITId, HITGroupId,
+            Latency (seconds of the create_hit call that succeeded) and
+            Retries, in set order, failed sets left out.
+    """
+    limiter = limiter or RateLimiter(rate, burst)
+    create_func = create_func or mtc.create_hit
+
+    def create(set_id):
+        retries = []
+        latency = [0.]
+
+        def timed_create(**kwargs):
+            # timed once a token is held, so queueing and backoff are left out
+            start = time.perf_counter()
+            try:
+                return create_func(**kwargs)
+            finally:
+                latency[0] = time.perf_counter() - start
+
+        new_hit = call_with_retries(timed_create, build_hit_kwargs(set_id),
+                                    limiter=limiter, max_retries=max_retries,
+                                    on_retry=lambda *args: retries.append(args))
+        record = dict(SetId=set_id,
+                      HITId=new_hit['HIT']['HITId'],
+                      HITGroupId=new_hit['HIT']['HITGroupId'],
+                      Latency=latency[0],
+                      Retries=len(retries))
+        if on_created is not None:
+            on_created(record)
+        return record
+
+    created = []
+    for set_id, record in run_concurrently(create, hit_set_ids, max_workers=max_workers,
+                                           return_exceptions=on_failed is not None):
+        if isinstance(record, Exception):
+            on_failed(set_id, record)
+        else:
+            created.append(record)
+    return created
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return float('nan')
+    index = min(len(values) - 1, max(0, int(round(q / 100. * (len(values) - 1)))))
+    return values[index]
+
+
+def summarize_latencies(created):
+    latencies = [record['Latency'] for record in created]
+    if not latencies:
+        return '\nNo create_hit calls were made.\n'
+    retries = sum(record['Retries'] for record in created)
+    return ('\ncreate_hit latency over %d calls (%d retries)\n' % (len(latencies), retries) +
+            '  min / p50 / p95 / max : %.3f / %.3f / %.3f / %.3f s\n' % (
+                min(latencies), percentile(latencies, 50),
+                percentile(latencies, 95), max(latencies)) +
+            '  total                 : %.3f s\n' % sum(latencies))
@@ -0,0 +1,294 @@
+"""
+    an in-process stand-in for the mturk client
+"""
+
+import time
+import random
+import hashlib
+import itertools
+import threading
+from collections import Counter, defaultdict
+
+from helpers import to_timestamp
+
+
+class FakeClientError(Exception):
+    """ Shaped like botocore's ClientError: the error is in err.response['Error']. """
+
+    def __init__(self, code, message, operation_name=''):
+        super().__init__('An error occurred (%s) when calling the %s operation: %s' % (
+            code, operation_name, message))
+        self.response = {'Error': {'Code': code, 'Message': message}}
+        self.operation_name = operation_name
+
+
+class FakeMTurkClient:
+    """ Implements the mturk calls this repo makes, in memory.
+
+    Register it with helpers.register_mtc(account, host, FakeMTurkClient())
+    to make make_mtc return it.
+
+    Args:
+        latency(float): Seconds every call takes.
+        latency_jitter(float): Up to this many seconds are added at random.
+        throttle_rate(float): The probability that a call is throttled.
+        failure_rate(float): The probability that a call fails with a ServiceFault.
+        balance(str): The AvailableBalance of the account.
+        seed(int): The seed of the random generator.
+    """
+
+    def __init__(self, latency=0., latency_jitter=0., throttle_rate=0., failure_rate=0.,
+                 balance='10000.00', seed=None):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.throttle_rate = throttle_rate
+        self.failure_rate = failure_rate
+        self.balance = balance
+        self.calls = Counter()
+
+        self._random = random.Random(seed)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = {}
+        self.tokens = {}
+        self.assignments = defaultdict(list)
+        self.qualification_types = {}
+        self.qualifications = defaultdict(dict)
+
+    # simulation
+    def _new_id(self, prefix):
+        with self._lock:
+            n = next(self._ids)
+        # MTurk ids are 30 upper case alphanumerics
+        return '%s%0*d' % (prefix, 30 - len(prefix), n)
+
+    def _call(self, operation_name):
+        with self._lock:
+            self.calls[operation_name] += 1
+            delay = self.latency + self._random.uniform(0, self.latency_jitter)
+            roll = self._random.random()
+        if delay:
+            time.sleep(delay)
+        if roll < self.throttle_rate:
+            raise FakeClientError('ThrottlingException', 'Rate exceeded', operation_name)
+        if roll < self.throttle_rate + self.failure_rate:
+            raise FakeClientError('ServiceFault', 'Injected failure', operation_name)
+
+    def _get_hit(self, HITId, operation_name):
+        if HITId not in self.hits:
+            raise FakeClientError('RequestError', 'Hit %s does not exist.' % HITId, operation_name)
+        return self.hits[HITId]
+
+    def add_qualification_type(self, name, worker_ids=()):
+        qt_id = self._new_id('QT')
+        self.qualification_types[qt_id] = dict(QualificationTypeId=qt_id, Name=name,
+                                               QualificationTypeStatus='Active')
+        for WorkerId in worker_ids:
+            self.qualifications[qt_id][WorkerId] = 1
+        return qt_id
+
+    def add_assignment(self, HITId, WorkerId, status='Submitted', answers=None):
+        """ Simulate a worker submitting an assignment of a HIT. """
+        answers = answers or {}
+        answer_xml = ('<QuestionFormAnswers xmlns="http://mechanicalturk.amazonaws.com/'
+                      'AWSMechanicalTurkDataSchemas/2005-10-01/QuestionFormAnswers.xsd">' +
+                      ''.join('<Answer><QuestionIdentifier>%s</QuestionIdentifier>'
+                              '<FreeText>%s</FreeText></Answer>' % item for item in answers.items()) +
+                      '</QuestionFormAnswers>')
+        assignment = dict(AssignmentId=self._new_id('A'), WorkerId=WorkerId, HITId=HITId,
+                          AssignmentStatus=status, SubmitTime=time.time(), Answer=answer_xml)
+        with self._lock:
+            hit = self.hits[HITId]
+            self.assignments[HITId].append(assignment)
+            hit['NumberOfAssignmentsAvailable'] -= 1
+            if status != 'Submitted':
+                hit['NumberOfAssignmentsCompleted'] += 1
+        return assignment
+
+    def simulate_workers(self, n_workers):
+        """ Simulate workers each submitting an assignment of a random HIT that takes workers. """
+        now = time.time()
+        with self._lock:
+            open_hit_ids = [HITId for HITId, hit in self.hits.items()
+                            if hit['HITStatus'] == 'Assignable' and hit['Expiration'] > now and
+                            hit['NumberOfAssignmentsAvailable'] > 0]
+            picks = [self._random.choice(open_hit_ids) for _ in range(n_workers)] if open_hit_ids else []
+
+        submitted = []
+        for HITId in picks:
+            if self.hits[HITId]['NumberOfAssignmentsAvailable'] > 0:
+                submitted.append(self.add_assignment(HITId, 'W%012d' % self._random.randrange(10 ** 12)))
+        return submitted
+
+    def _page(self, items, MaxResults=100, NextToken=None):
+        start = int(NextToken or 0)
+        page = items[start:start + MaxResults]
+        next_token = str(start + MaxResults) if start + MaxResults < len(items) else None
+        return page, next_token
+
+    # account
+    def get_account_balance(self):
+        self._call('GetAccountBalance')
+        return {'AvailableBalance': self.balance}
+
+    # HITs
+    def create_hit(self, **kwargs):
+        self._call('CreateHIT')
+        token = kwargs.get('UniqueRequestToken')
+        group_key = repr([kwargs.get(k) for k in ('Title', 'Description', 'Keywords', 'Reward',
+                                                  'AssignmentDurationInSeconds',
+                                                  'QualificationRequirements')])
+        hit = dict(HITId=self._new_id('H'),
+                   HITTypeId='T' + hashlib.sha1(group_key.encode()).hexdigest()[:29].upper(),
+                   HITGroupId='G' + hashlib.sha1(group_key.encode()).hexdigest()[:29].upper(),
+                   HITStatus='Assignable',
+                   CreationTime=time.time(),
+                   Expiration=time.time() + kwargs.get('LifetimeInSeconds', 0),
+                   MaxAssignments=kwargs.get('MaxAssignments', 1),
+                   NumberOfAssignmentsPending=0,
+                   NumberOfAssignmentsAvailable=kwargs.get('MaxAssignments', 1),
+                   NumberOfAssignmentsCompleted=0,
+                   **{k: kwargs.get(k) for k in ('Title', 'Description', 'Keywords', 'Reward', 'Question')})
+        with self._lock:
+            if token is not None and token in self.tokens:
+                raise FakeClientError(
+                    'RequestError', 'The HIT with ID %s already exists for the UniqueRequestToken %s.' % (
+                        self.tokens[token], token), 'CreateHIT')
+            self.hits[hit['HITId']] = hit
+            if token is not None:
+                self.tokens[token] = hit['HITId']
+        return {'HIT': dict(hit)}
+
+    def get_hit(self, HITId):
+        self._call('GetHIT')
+        with self._lock:
+            return {'HIT': dict(self._get_hit(HITId, 'GetHIT'))}
+
+    def list_hits(self, MaxResults=100, NextToken=None):
+        self._call('ListHITs')
+        with self._lock:
+            hits, next_token = self._page(list(self.hits.values()), MaxResults, NextToken)
+            response = {'NumResults': len(hits), 'HITs': [dict(hit) for hit in hits]}
+        if next_token:
+            response['NextToken'] = next_token
+        return response
+
+    def update_expiration_for_hit(self, HITId, ExpireAt):
+        self._call('UpdateExpirationForHIT')
+        with self._lock:
+            hit = self._get_hit(HITId, 'UpdateExpirationForHIT')
+            hit['Expiration'] = to_timestamp(ExpireAt)
+            if hit['Expiration'] <= time.time() and hit['HITStatus'] == 'Assignable':
+                hit['HITStatus'] = 'Reviewable'
+            elif hit['Expiration'] > time.time() and hit['HITStatus'] == 'Reviewable':
+                hit['HITStatus'] = 'Assignable'
+        return {}
+
+    def create_additional_assignments_for_hit(self, HITId, NumberOfAdditionalAssignments,
+                                              UniqueRequestToken=None):
+        self._call('CreateAdditionalAssignmentsForHIT')
+        with self._lock:
+            hit = self._get_hit(HITId, 'CreateAdditionalAssignmentsForHIT')
+            if UniqueRequestToken is not None:
+                if UniqueRequestToken in self.tokens:
+                    raise FakeClientError('RequestError', 'The UniqueRequestToken %s has already been used.' %
+                                          UniqueRequestToken, 'CreateAdditionalAssignmentsForHIT')
+                self.tokens[UniqueRequestToken] = HITId
+            hit['MaxAssignments'] += NumberOfAdditionalAssignments
+            hit['NumberOfAssignmentsAvailable'] += NumberOfAdditionalAssignments
+            if hit['HITStatus'] == 'Reviewable' and hit['Expiration'] > time.time():
+                hit['HITStatus'] = 'Assignable'
+        return {}
+
+    def delete_hit(self, HITId):
+        self._call('DeleteHIT')
+        with self._lock:
+            hit = self._get_hit(HITId, 'DeleteHIT')
+            if hit['HITStatus'] == 'Assignable' and hit['Expiration'] > time.time():
+                raise FakeClientError('RequestError', 'This HIT is currently in the state '
+                                      "'Assignable'. This operation can be called with a status of: "
+                                      'Reviewing, Reviewable', 'DeleteHIT')
+            if any(a['AssignmentStatus'] == 'Submitted' for a in self.assignments[HITId]):
+                raise FakeClientError('RequestError', 'This HIT has assignments to review.', 'DeleteHIT')
+            hit['HITStatus'] = 'Disposed'
+        return {}
+
+    # qualifications
+    def get_qualification_type(self, QualificationTypeId):
+        self._call('GetQualificationType')
+        if QualificationTypeId not in self.qualification_types:
+            raise FakeClientError('RequestError', 'QualificationType %s does not exist.' % QualificationTypeId,
+                                  'GetQualificationType')
+        return {'QualificationType': dict(self.qualification_types[QualificationTypeId])}
+
+    def list_workers_with_qualification_type(self, QualificationTypeId, Status=None,
+                                             MaxResults=100, NextToken=None):
+        self._call('ListWorkersWithQualificationType')
+        with self._lock:
+            qualifications = [dict(QualificationTypeId=QualificationTypeId, WorkerId=WorkerId,
+                                   IntegerValue=value, Status='Granted')
+                              for WorkerId, value in self.qualifications[QualificationTypeId].items()]
+        page, next_token = self._page(qualifications, MaxResults, NextToken)
+        response = {'NumResults': len(page), 'Qualifications': page}
+        if next_token:
+            response['NextToken'] = next_token
+        return response
+
+    def associate_qualification_with_worker(self, QualificationTypeId, WorkerId,
+                                            IntegerValue=1, SendNotification=False):
+        self._call('AssociateQualificationWithWorker')
+        with self._lock:
+            self.qualifications[QualificationTypeId][WorkerId] = IntegerValue
+        return {}
+
+    def disassociate_qualification_from_worker(self, QualificationTypeId, WorkerId, Reason=None):
+        self._call('DisassociateQualificationFromWorker')
+        with self._lock:
+            self.qualifications[QualificationTypeId].pop(WorkerId, None)
+        return {}
+
+    # assignments
+    def list_assignments_for_hit(self, HITId, MaxResults=100, NextToken=None, AssignmentStatuses=None):
+        self._call('ListAssignmentsForHIT')
+        with self._lock:
+            self._get_hit(HITId, 'ListAssignmentsForHIT')
+            assignments = [dict(a) for a in self.assignments[HITId]
+                           if not AssignmentStatuses or a['AssignmentStatus'] in AssignmentStatuses]
+        page, next_token = self._page(assignments, MaxResults, NextToken)
+        response = {'NumResults': len(page), 'Assignments': page}
+        if next_token:
+            response['NextToken'] = next_token
+        return response
+
+    def get_assignment(self, AssignmentId):
+        self._call('GetAssignment')
+        with self._lock:
+            return {'Assignment': dict(self._find_assignment(AssignmentId, 'GetAssignment'))}
+
+    def _find_assignment(self, AssignmentId, operation_name):
+        for assignments in self.assignments.values():
+            for assignment in assignments:
+                if assignment['AssignmentId'] == AssignmentId:
+                    return assignment
+        raise FakeClientError('RequestError', 'Assignment %s does not exist.' % AssignmentId, operation_name)
+
+    def _review(self, AssignmentId, status, operation_name):
+        self._call(operation_name)
+        with self._lock:
+            assignment = self._find_assignment(AssignmentId, operation_name)
+            if assignment['AssignmentStatus'] != 'Submitted':
+                raise FakeClientError('RequestError', 'Assignment %s is %s.' % (
+                    AssignmentId, assignment['AssignmentStatus']), operation_name)
+            assignment['AssignmentStatus'] = status
+            self.hits[assignment['HITId']]['NumberOfAssignmentsCompleted'] += 1
+        return {}
+
+    def approve_assignment(self, AssignmentId, RequesterFeedback=None, OverrideRejection=False):
+        return self._review(AssignmentId, 'Approved', 'ApproveAssignment')
+
+    def reject_assignment(self, AssignmentId, RequesterFeedback):
+        return self._review(AssignmentId, 'Rejected', 'RejectAssignment')
+
+    def send_bonus(self, WorkerId, BonusAmount, AssignmentId, Reason, UniqueRequestToken=None):
+        self._call('SendBonus')
+        return {}
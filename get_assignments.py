@@ -0,0 +1,110 @@
+"""
+    harvest the assignments of posted HITs
+"""
+
+import json
+import threading
+
+from helpers import (set_logging_configs, make_mtc, get_worker_count, iter_assignments_for_hit,
+                     iter_hits_in_group, parse_answer_xml)
+from engine import ThrottledClient, run_concurrently
+from journal import CreationJournal, get_journal_path
+
+
+def get_hit_ids(mtc, HITIds=None, HITGroupId=None, journal=None):
+    """ The HITIds to harvest: the given ones, or those of a HIT group.
+
+    A HIT group is looked up in the creation journal when there is one,
+    and by scanning every HIT of the account otherwise.
+    """
+    if HITIds:
+        return list(HITIds)
+    if journal is not None:
+        HITIds = [hit['HITId'] for hit in journal.created_hits(HITGroupId)]
+        if HITIds:
+            return HITIds
+    return [hit['HITId'] for hit in iter_hits_in_group(ThrottledClient(mtc, rate=None), HITGroupId)]
+
+
+def format_assignment(assignment):
+    record = dict(assignment)
+    if 'Answer' in record:
+        record['Answer'] = parse_answer_xml(record['Answer'])
+    return record
+
+
+def harvest_assignments(mtc, HITIds, out_path, statuses=None, max_workers=8, rate=5.):
+    """ Write every assignment of the HITs to a JSONL file as it arrives.
+
+    HITs are paged concurrently; each page is written out and dropped, so
+    memory does not grow with the size of the study.
+
+    Args:
+        mtc: A mturk client.
+        HITIds(iterable): The HITs to harvest.
+        out_path(str): The JSONL file to write.
+        statuses(list): Only harvest assignments in these AssignmentStatuses.
+        max_workers(int): The number of HITs paged concurrently.
+        rate(float): The maximum number of list calls per second.
+
+    Returns:
+        counts(dict): The number of assignments written per HITId.
+    """
+    mtc = ThrottledClient(mtc, rate=rate)
+    lock = threading.Lock()
+
+    with open(out_path, 'w') as f:
+        def harvest(HITId):
+            count = 0
+            for assignment in iter_assignments_for_hit(mtc, HITId, statuses=statuses):
+                line = json.dumps(format_assignment(assignment), default=str) + '\n'
+                with lock:
+                    f.write(line)
+                count += 1
+            return count
+
+        return dict(run_concurrently(harvest, HITIds, max_workers=max_workers))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    # create parser object
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--account', type=str,
+                        help='Which requester account to use?')
+    parser.add_argument('--host', type=str, default='sandbox',
+                        help='Which platform to host, sandbox or formal?')
+    parser.add_argument('--hit_ids', type=str, nargs='*',
+                        help='Which HITs to harvest?')
+    parser.add_argument('--group', type=str,
+                        help='Which HIT group to harvest?')
+    parser.add_argument('--project', type=str,
+                        help='Which project journal to find the HITs of the group in?')
+    parser.add_argument('--status', type=str, nargs='*',
+                        help='Which assignment statuses to harvest, Submitted, Approved or Rejected?')
+    parser.add_argument('--out', type=str, default='assignments.jsonl',
+                        help='Which JSONL file to write?')
+    parser.add_argument('--workers', type=get_worker_count, default=8,
+                        help='How many HITs to page concurrently?')
+
+    # parse terminal inputs
+    args = parser.parse_args()
+    if not args.hit_ids and not args.group:
+        parser.error('either --hit_ids or --group is required')
+
+    logger = set_logging_configs(__name__)
+    mtc = make_mtc(args.account, args.host)
+
+    journal = None
+    if args.project:
+        from post_hits import get_project_path
+        journal = CreationJournal(
+            get_journal_path(get_project_path(args.project), args.account, args.host),
+            args.project, args.account, args.host)
+
+    HITIds = get_hit_ids(mtc, args.hit_ids, args.group, journal=journal)
+    counts = harvest_assignments(mtc, HITIds, args.out, statuses=args.status,
+                                 max_workers=args.workers)
+    logger.info('\n%d assignments of %d HITs are written to %s\n' % (
+        sum(counts.values()), len(counts), args.out))
@@ -1,26 +1,98 @@
 
 import os
 import sys
+import json
+import queue
+import atexit
 import logging
+import logging.handlers
 import random
 import string
+import time
+import threading
+import bisect
+import datetime
+import functools
 import configparser
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import API_METRICS
+from engine import ThrottledClient, call_with_retries
 
 
 CONFIG_SECTIONS = {'INFO', 'SETUP', 'HITSET', 'NUM APPROVED', 'PERCENT APPROVED',
                    'LOCATION', 'EXCLUDE QUALIFICATION TYPE', 'INCLUDE QUALIFICATION TYPE', 'TEST'}
+REQUIRED_CONFIG_SECTIONS = {'INFO', 'SETUP'}
+
+
+APIKEY_PATH = '/Volumes/turk/boto'
+REQUESTER_ACCOUNTS = ('alvarezlab', 'konklab')
+
+# the connections of a client, enough for the concurrent creation engine
+MAX_POOL_CONNECTIONS = 32
+
+# mturk clients shared by the whole process, keyed by (account, host)
+_MTC_REGISTRY = {}
+_MTC_REGISTRY_LOCK = threading.Lock()
 
 
 def make_mtc(account, host):
+    """ Return the process-wide mturk client of an account and host.
+
+    The client (and the boto3 import, credentials and endpoint setup behind it)
+    is built on the first call only. boto3 clients are thread-safe, so the
+    connection pool is sized for the concurrent creation engine.
+    """
+    key = (account, host)
+    with _MTC_REGISTRY_LOCK:
+        if key not in _MTC_REGISTRY:
+            _MTC_REGISTRY[key] = _build_mtc(account, host)
+        return _MTC_REGISTRY[key]
+
+
+def get_worker_count(value):
+    """ An argparse type: a number of workers that one client's connection pool can serve. """
+    import argparse
+
+    n_workers = int(value)
+    if not 1 <= n_workers <= MAX_POOL_CONNECTIONS:
+        raise argparse.ArgumentTypeError('the number of workers must be between 1 and %d' %
+                                         MAX_POOL_CONNECTIONS)
+    return n_workers
+
+
+def register_mtc(account, host, mtc):
+    """ Make make_mtc(account, host) return mtc, e.g. a fake client. """
+    with _MTC_REGISTRY_LOCK:
+        _MTC_REGISTRY[(account, host)] = mtc
+
+
+def clear_mtc_registry():
+    with _MTC_REGISTRY_LOCK:
+        _MTC_REGISTRY.clear()
+
+
+def _build_mtc(account, host):
     import boto3
+    from botocore.config import Config
+    build_started_at = time.perf_counter()
+
     # get property settings for HIT
     endpoint_url = get_endpoint_url(host)
+    # throttled and transient failures are retried (and counted) by the engine only, not by botocore as well
+    client_config = Config(max_pool_connections=MAX_POOL_CONNECTIONS,
+                           retries=dict(total_max_attempts=1, mode='standard'))
     client_kwargs = dict(endpoint_url=endpoint_url,
-                         region_name='us-east-1')
+                         region_name='us-east-1',
+                         config=client_config)
 
-    APIkey_kwargs = get_APIkey(account)
-    mtc = boto3.client('mturk', **client_kwargs, **APIkey_kwargs)
-    return mtc
+    APIkey_kwargs = API_METRICS.timed('get_APIkey', get_APIkey, account)
+    # a private session, the default one is not thread-safe
+    session = boto3.session.Session()
+    mtc = session.client('mturk', **client_kwargs, **APIkey_kwargs)
+    API_METRICS.record_step('make_mtc', time.perf_counter() - build_started_at)
+    return API_METRICS.attach(mtc)
 
 
 class ExternalQuestion:
@@ -54,28 +126,114 @@ def is_confirmed(notice):
             response = input(respond_again_notice).lower()
 
 
-def set_logging_configs(module_name, stream=True, save_log_path=None):
+# the queue handler and listener thread of every logger set up by set_logging_configs
+_LOG_LISTENERS = {}
+_LOG_LISTENERS_LOCK = threading.Lock()
+
+
+class EventFilter(logging.Filter):
+    """ Keep (or, with events_only=False, drop) the records logged with log_event only. """
+
+    def __init__(self, events_only=True):
+        super().__init__()
+        self.events_only = events_only
+
+    def filter(self, record):
+        if self.events_only:
+            return hasattr(record, 'event')
+        return not getattr(record, 'event_only', False)
+
+
+class JsonlEventHandler(logging.FileHandler):
+    """ Write the structured event of each record as a JSON line. """
+
+    def format(self, record):
+        event = dict(time=record.created, logger=record.name, **record.event)
+        return json.dumps(event, default=str)
+
+
+def log_event(logger, event, message=None, **fields):
+    """ Log a structured event; it only reaches the text log if a message is given. """
+    extra = dict(event=dict(event=event, **fields))
+    if message is None:
+        extra['event_only'] = True
+    logger.info(message if message is not None else event, extra=extra)
+
+
+def set_logging_configs(module_name, stream=True, save_log_path=None, events_path=None):
+    """ Log through a queue, so that a slow log file never blocks the caller.
+
+    The handlers run on a background listener thread. Calling it again for
+    the same module replaces the previous handlers instead of adding more.
+    Records logged with log_event also go to events_path as JSON lines,
+    which defaults to a .events.jsonl file next to save_log_path.
+    """
     # logging configurations
     logger = logging.getLogger(module_name)
     logger.setLevel(logging.INFO)
+    stop_logging(module_name)
 
     formatter = logging.Formatter('%(asctime)s:%(name)s:%(message)s')
+    handlers = []
 
     # print logging info
     if stream:
-        stream_handler = logging.StreamHandler()
-        stream_handler.setFormatter(formatter)
-        logger.addHandler(stream_handler)
+        handlers.append(logging.StreamHandler())
 
     # save logging info into a file
     if save_log_path:
-        file_handler = logging.FileHandler(save_log_path)
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-
+        handlers.append(logging.FileHandler(save_log_path))
+        if events_path is None:
+            events_path = os.path.splitext(save_log_path)[0] + '.events.jsonl'
+
+    for handler in handlers:
+        handler.setFormatter(formatter)
+        handler.addFilter(EventFilter(events_only=False))
+
+    # save structured events into a JSONL file
+    if events_path:
+        event_handler = JsonlEventHandler(events_path)
+        event_handler.addFilter(EventFilter(events_only=True))
+        handlers.append(event_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    logger.addHandler(queue_handler)
+
+    with _LOG_LISTENERS_LOCK:
+        _LOG_LISTENERS[module_name] = (queue_handler, listener, handlers)
     return logger
 
 
+def flush_logging(module_name):
+    """ Wait until every queued record of a module is handled, e.g. before a prompt. """
+    with _LOG_LISTENERS_LOCK:
+        entry = _LOG_LISTENERS.get(module_name)
+    if entry is not None:
+        _, listener, _ = entry
+        # stopping the listener drains the queue
+        listener.stop()
+        listener.start()
+
+
+def stop_logging(module_name=None):
+    """ Flush and remove the handlers of a module, or of every module. """
+    with _LOG_LISTENERS_LOCK:
+        names = list(_LOG_LISTENERS) if module_name is None else [module_name]
+        entries = [(name, _LOG_LISTENERS.pop(name)) for name in names if name in _LOG_LISTENERS]
+
+    for name, (queue_handler, listener, handlers) in entries:
+        logging.getLogger(name).removeHandler(queue_handler)
+        listener.stop()
+        for handler in handlers:
+            handler.close()
+
+
+atexit.register(stop_logging)
+
+
 def check_file_exists(project_path, file_name):
 
     file_path = os.path.join(project_path, file_name)
@@ -108,9 +266,10 @@ def get_preview_url(host):
             'INPUT host "%s" does not exist, please use "sandbox" or "formal".' % host)
 
 
+@functools.lru_cache(maxsize=None)
 def get_APIkey(account):
-    import sys
-    sys.path.append('/Volumes/turk/boto')
+    if APIKEY_PATH not in sys.path:
+        sys.path.append(APIKEY_PATH)
 
     if account == "alvarezlab":
         from alvarezlab import ACCESS_ID, SECRET_KEY
@@ -127,15 +286,27 @@ def read_config(project_path, config_file):
     config_file = os.path.join(project_path, config_file)
 
     config = configparser.ConfigParser()
-    config.read(config_file)
-
     try:
-        assert(set(config.sections()) <= CONFIG_SECTIONS)
-    except AssertionError as err:
-        err.args += ("CONFIG file section names are incorrect.",)
-        raise
-    else:
-        return config
+        config.read(config_file)
+    except configparser.Error as err:
+        raise RuntimeError('CONFIG file cannot be parsed: %s' % err) from err
+
+    sections = set(config.sections())
+    if not sections <= CONFIG_SECTIONS:
+        raise RuntimeError('CONFIG file section names are incorrect: %s.' % (
+            ', '.join(sorted(sections - CONFIG_SECTIONS))))
+    if not REQUIRED_CONFIG_SECTIONS <= sections:
+        raise RuntimeError('CONFIG file sections are missing: %s.' % (
+            ', '.join(sorted(REQUIRED_CONFIG_SECTIONS - sections))))
+    return config
+
+
+def check_fields(name, fields, keys):
+    if set(fields) != keys:
+        missing, unknown = keys - set(fields), set(fields) - keys
+        raise RuntimeError('CONFIG file %s fields are incorrect:%s%s.' % (
+            name, ' missing %s' % ', '.join(sorted(missing)) if missing else '',
+            ' unknown %s' % ', '.join(sorted(unknown)) if unknown else ''))
 
 
 def underscore_to_camel(string):
@@ -145,14 +316,8 @@ def underscore_to_camel(string):
 def get_hit_descriptions(config):
     key_value_pairs = {underscore_to_camel(k): config[k] for k in config}
     # check description kwargs
-    keys = {'Description', 'Keywords', 'Title'}
-    try:
-        assert(set(key_value_pairs.keys()) == keys)
-    except AssertionError as err:
-        err.args += ("CONFIG file DESCRIPTION fields are incorrect.",)
-        raise
-    else:
-        return key_value_pairs
+    check_fields('DESCRIPTION', key_value_pairs, {'Description', 'Keywords', 'Title'})
+    return key_value_pairs
 
 
 def get_hit_setups(config):
@@ -169,81 +334,185 @@ def get_hit_setups(config):
     key_val_pairs = {underscore_to_camel(
         k): config[k] for k in config}
 
+    # check setup kwargs
+    check_fields('SETUP', key_val_pairs, set(reformater) | {'Reward'})
     for old_key, (new_key, func) in reformater.items():
         value = key_val_pairs.pop(old_key)
-        key_val_pairs[new_key] = func(value)
-
-    # check description kwargs
-    keys = {'AssignmentDurationInSeconds', 'AutoApprovalDelayInSeconds',
-            'LifetimeInSeconds', 'MaxAssignments', 'Reward'}
+        try:
+            key_val_pairs[new_key] = func(value)
+        except ValueError:
+            raise RuntimeError('CONFIG file SETUP %s "%s" is not an integer.' % (old_key, value)) from None
     try:
-        assert(set(key_val_pairs.keys()) == keys)
-    except AssertionError as err:
-        err.args += ("CONFIG file SETUP fields are incorrect.",)
-        raise
-    else:
-        return key_val_pairs
+        float(key_val_pairs['Reward'])
+    except ValueError:
+        raise RuntimeError('CONFIG file SETUP Reward "%s" is not a number.' % key_val_pairs['Reward']) from None
+    return key_val_pairs
 
 
 def get_qualification_requirements(qualification, config):
 
     qr_dict = dict(ActionsGuarded='DiscoverPreviewAndAccept')
 
-    if qualification == 'percent_assignments_approved':
-        qr_dict['QualificationTypeId'] = '000000000000000000L0'
-        qr_dict['Comparator'] = 'GreaterThanOrEqualTo'
-        qr_dict['IntegerValues'] = [int(config['percent'])]
-
-    elif qualification == 'num_hit_approved':
-        qr_dict['QualificationTypeId'] = '00000000000000000040'
-        qr_dict['Comparator'] = 'GreaterThanOrEqualTo'
-        qr_dict['IntegerValues'] = [int(config['num'])]
-
-    elif qualification == 'location':
-        qr_dict['QualificationTypeId'] = '00000000000000000071'
-        qr_dict['Comparator'] = 'EqualTo'
-        qr_dict['LocaleValues'] = [dict(Country=config['country'])]
-
-    elif qualification == 'exclude_qualification_type':
-        qr_dict['QualificationTypeId'] = config['id']
-        qr_dict['Comparator'] = 'DoesNotExist'
-
-    elif qualification == 'include_qualification_type':
-        qr_dict['QualificationTypeId'] = config['id']
-        qr_dict['Comparator'] = 'Exists'
-    else:
-        raise RuntimeError('The qualification input is incorrect')
+    try:
+        if qualification == 'percent_assignments_approved':
+            qr_dict['QualificationTypeId'] = '000000000000000000L0'
+            qr_dict['Comparator'] = 'GreaterThanOrEqualTo'
+            qr_dict['IntegerValues'] = [int(config['percent'])]
+
+        elif qualification == 'num_hit_approved':
+            qr_dict['QualificationTypeId'] = '00000000000000000040'
+            qr_dict['Comparator'] = 'GreaterThanOrEqualTo'
+            qr_dict['IntegerValues'] = [int(config['num'])]
+
+        elif qualification == 'location':
+            qr_dict['QualificationTypeId'] = '00000000000000000071'
+            qr_dict['Comparator'] = 'EqualTo'
+            qr_dict['LocaleValues'] = [dict(Country=config['country'])]
+
+        elif qualification == 'exclude_qualification_type':
+            qr_dict['QualificationTypeId'] = config['id']
+            qr_dict['Comparator'] = 'DoesNotExist'
+
+        elif qualification == 'include_qualification_type':
+            qr_dict['QualificationTypeId'] = config['id']
+            qr_dict['Comparator'] = 'Exists'
+        else:
+            raise RuntimeError('The qualification input is incorrect')
+    except KeyError as err:
+        raise RuntimeError('CONFIG file %s has no %s field.' % (qualification, err.args[0])) from None
+    except ValueError as err:
+        raise RuntimeError('CONFIG file %s field is not an integer: %s' % (qualification, err)) from None
 
     return qr_dict
 
 
 def get_hit_set_ids(config):
+    if 'HSetId' not in config:
+        raise RuntimeError('CONFIG file HITSET has no HSetId field.')
     HSetId_str = config['HSetId']
-    return parse_HSetId_str(HSetId_str)
+    hit_set_ids = parse_HSetId_str(HSetId_str)
+    if not hit_set_ids:
+        raise RuntimeError('CONFIG file HSetId "%s" selects no sets.' % HSetId_str)
+    return hit_set_ids
+
+
+class HSetIdRange:
+    """ A lazy set of HSetIds, stored as sorted, disjoint (start, end) intervals.
+
+    Iterating yields the ids in ascending order without building a list, and
+    str() gives the compact form, e.g. "1-500, 612, 700-900".
+    """
+
+    def __init__(self, intervals=()):
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        self.intervals = merged
+        self._starts = [start for start, _ in merged]
+
+    def __iter__(self):
+        for start, end in self.intervals:
+            yield from range(start, end + 1)
+
+    def __len__(self):
+        return sum(end - start + 1 for start, end in self.intervals)
+
+    def __contains__(self, set_id):
+        i = bisect.bisect_right(self._starts, set_id) - 1
+        return i >= 0 and set_id <= self.intervals[i][1]
+
+    def __eq__(self, other):
+        return isinstance(other, HSetIdRange) and self.intervals == other.intervals
+
+    def __repr__(self):
+        return 'HSetIdRange(%r)' % str(self)
+
+    def __str__(self):
+        return ', '.join(str(start) if start == end else '%d-%d' % (start, end)
+                         for start, end in self.intervals)
+
+    def difference(self, set_ids):
+        """ The ids that are not in set_ids. """
+        # runs of consecutive ids become one interval, so the merge stays linear
+        removed = []
+        for set_id in sorted(set(set_ids)):
+            if removed and set_id == removed[-1][1] + 1:
+                removed[-1] = (removed[-1][0], set_id)
+            else:
+                removed.append((set_id, set_id))
+        return HSetIdRange(_subtract_intervals(self.intervals, removed))
+
+    def split(self, sizes):
+        """ Consecutive shards holding sizes[0], sizes[1], ... ids. """
+        shards = []
+        intervals = list(self.intervals)
+        for size in sizes:
+            shard = []
+            while size > 0 and intervals:
+                start, end = intervals[0]
+                if end - start + 1 <= size:
+                    shard.append(intervals.pop(0))
+                    size -= end - start + 1
+                else:
+                    shard.append((start, start + size - 1))
+                    intervals[0] = (start + size, end)
+                    size = 0
+            shards.append(HSetIdRange(shard))
+        return shards
+
+
+def _subtract_intervals(intervals, removed):
+    # remove sorted, disjoint intervals from sorted, disjoint intervals in one pass
+    result = []
+    i = 0
+    for a, b in intervals:
+        # skip the removed intervals that end before this one
+        while i < len(removed) and removed[i][1] < a:
+            i += 1
+        j = i
+        while j < len(removed) and removed[j][0] <= b:
+            start, end = removed[j]
+            if start > a:
+                result.append((a, start - 1))
+            a = max(a, end + 1)
+            j += 1
+        if a <= b:
+            result.append((a, b))
+        # the last overlapping interval may reach into the next one
+        i = max(i, j - 1)
+    return result
 
 
 def parse_HSetId_str(HSetId_str):
-    import re
+    """ Parse an HSetId spec into an HSetIdRange.
 
-    if HSetId_str.isdigit():
-        return [int(HSetId_str)]
-
-    elif re.match(r'^\d+:\d+$', HSetId_str):
-        start_id, end_id = HSetId_str.split(':')
-        return list(range(int(start_id), int(end_id) + 1))
+    The spec is a comma separated list of ids ("612") and ranges ("1-500" or
+    "700:900"); an item starting with "!" is excluded, e.g. "1-500,!250-260".
+    Duplicates are merged.
+    """
+    import re
 
-    elif re.match(r'^\d+-\d+$', HSetId_str):
-        start_id, end_id = HSetId_str.split('-')
-        return list(range(int(start_id), int(end_id) + 1))
+    included, excluded = [], []
+    for item in HSetId_str.replace(' ', '').split(','):
+        match = re.match(r'^(!?)(\d+)(?:[:-](\d+))?$', item)
+        if not match:
+            raise RuntimeError('CONFIG file HSetId is incorrect.')
 
-    elif re.match(r'\d+(,\d+)+$', HSetId_str):
-        return [int(i) for i in HSetId_str.split(',')]
+        is_excluded, start_id, end_id = match.groups()
+        start_id = int(start_id)
+        end_id = int(end_id) if end_id is not None else start_id
+        if end_id < start_id:
+            raise RuntimeError('CONFIG file HSetId is incorrect.')
+        (excluded if is_excluded else included).append((start_id, end_id))
 
-    else:
-        raise RuntimeError('CONFIG file HSetId is incorrect.')
+    intervals = _subtract_intervals(HSetIdRange(included).intervals, HSetIdRange(excluded).intervals)
+    return HSetIdRange(intervals)
 
 
-def get_review(name, param, mtc=None):
+def get_review(name, param, mtc=None, cache=None):
     if name == 'description':
         return ("\nDescribe your task to Workers ...\n" +
                 '    Title       : %s\n' % param["title"] +
@@ -269,37 +538,116 @@ def get_review(name, param, mtc=None):
 
     elif name.endswith('qualification_type'):
         qt_id = param['id']
-        qt_name = mtc.get_qualification_type(QualificationTypeId=qt_id)[
-            'QualificationType']['Name']
-        qt_num = mtc.list_workers_with_qualification_type(
-            QualificationTypeId=qt_id, MaxResults=100)['NumResults']
-        # the max number of results that boto3 allowed is 100
-        qt_num_str = str(qt_num) if qt_num < 100 else 'more than 100'
+        cached = cache.get(qt_id) if cache is not None else None
+        if cached is not None:
+            qt_name, qt_num = cached['Name'], cached['NumWorkers']
+            cache_note = ' (cached %d min ago)' % ((time.time() - cached['cached_at']) // 60)
+        else:
+            # the name and the worker count are independent round trips
+            mtc = ThrottledClient(mtc, rate=None)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                qt_future = executor.submit(mtc.get_qualification_type, QualificationTypeId=qt_id)
+                qt_num_future = executor.submit(count_workers_with_qualification_type, mtc, qt_id)
+                qt_name = qt_future.result()['QualificationType']['Name']
+                qt_num = qt_num_future.result()
+            cache_note = ''
+            if cache is not None:
+                cache.set(qt_id, qt_name, qt_num)
 
         if name.startswith('exclude'):
             task = 'excluded'
         elif name.startswith('include'):
             task = 'included'
-        return "    You've %s %s Workers with **%s**.\n" % (task, qt_num_str, qt_name)
+        return "    You've %s %d Workers with **%s**%s.\n" % (task, qt_num, qt_name, cache_note)
     else:
         raise RuntimeError('The INPUT of qualification is incorrect')
 
 
-def get_aws_shell_list_hits(HITGroupId, host, max_results=5):
-    command = ("mturk list-hits --output table --query 'HITs[?HITGroupId==`PLACEHOLDER`]" +
-               ".{\"1. HITId\": HITId, \"2. Title\": Title, \"3. Status\": HITStatus, " +
-               "\"4.Num Total\": MaxAssignments, \"5.Num Pending\": NumberOfAssignmentsPending, "
-               "\"6.Num Completed\": NumberOfAssignmentsCompleted}\'")
+def get_available_balance(mtc):
+    return float(call_with_retries(mtc.get_account_balance, {})['AvailableBalance'])
 
-    if host == 'sandbox':
-        command += " --endpoint-url https://mturk-requester-sandbox.us-east-1.amazonaws.com"
 
-    return command.replace('PLACEHOLDER', HITGroupId)
+def iter_workers_with_qualification_type(mtc, qt_id, status=None, page_size=100):
+    """ Stream every worker qualification of a qualification type, following NextToken. """
+    kwargs = dict(QualificationTypeId=qt_id, MaxResults=page_size)
+    if status:
+        kwargs['Status'] = status
 
+    while True:
+        response = mtc.list_workers_with_qualification_type(**kwargs)
+        yield from response['Qualifications']
 
-def get_aws_shell_list_assignments(HITIds, host):
-    command = ('mturk list-assignments-for-hit --hit-id PLACEHOLDER --query "Assignments[].' +
-               '{AssignmentId: AssignmentId, Status: AssignmentStatus, WorkerId: WorkerId}" --output "table"')
-    if host == 'sandbox':
-        command += " --endpoint-url https://mturk-requester-sandbox.us-east-1.amazonaws.com"
-    return '\n'.join([command.replace('PLACEHOLDER', id_) for id_ in HITIds])
+        # the max number of results that boto3 allowed per page is 100
+        next_token = response.get('NextToken')
+        if not next_token or not response['Qualifications']:
+            break
+        kwargs['NextToken'] = next_token
+
+
+def count_workers_with_qualification_type(mtc, qt_id, status=None):
+    return sum(1 for _ in iter_workers_with_qualification_type(mtc, qt_id, status=status))
+
+
+def iter_assignments_for_hit(mtc, HITId, statuses=None, page_size=100):
+    """ Stream every assignment of a HIT, following NextToken. """
+    kwargs = dict(HITId=HITId, MaxResults=page_size)
+    if statuses:
+        kwargs['AssignmentStatuses'] = list(statuses)
+
+    while True:
+        response = mtc.list_assignments_for_hit(**kwargs)
+        yield from response['Assignments']
+
+        next_token = response.get('NextToken')
+        if not next_token or not response['Assignments']:
+            break
+        kwargs['NextToken'] = next_token
+
+
+def to_timestamp(value):
+    # boto3 returns datetimes, the fake client floats; naive datetimes are UTC, like in botocore
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value.timestamp()
+    return value
+
+
+def iter_hits_in_group(mtc, HITGroupId, page_size=100):
+    """ Stream the HITs of a HIT group by listing every HIT of the account.
+
+    This is a full account scan, prefer the HITIds in the creation journal when there is one.
+    """
+    kwargs = dict(MaxResults=page_size)
+    while True:
+        response = mtc.list_hits(**kwargs)
+        for hit in response['HITs']:
+            if hit['HITGroupId'] == HITGroupId:
+                yield hit
+
+        next_token = response.get('NextToken')
+        if not next_token or not response['HITs']:
+            break
+        kwargs['NextToken'] = next_token
+
+
+def parse_answer_xml(answer_xml):
+    """ Turn the QuestionFormAnswers XML of an assignment into {QuestionIdentifier: answer}.
+
+    Questions with several selections map to a list of them.
+    """
+    def local_name(tag): return tag.rsplit('}', 1)[-1]
+
+    answers = {}
+    for answer in ET.fromstring(answer_xml):
+        if local_name(answer.tag) != 'Answer':
+            continue
+
+        question_id, values = None, []
+        for child in answer:
+            if local_name(child.tag) == 'QuestionIdentifier':
+                question_id = child.text
+            else:
+                values.append(child.text)
+        answers[question_id] = values[0] if len(values) == 1 else values
+    return answers
@@ -0,0 +1,131 @@
+"""
+    append-only journal of HIT creation
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+
+
+def get_journal_path(project_path, account, host):
+    return os.path.join(project_path, '.log', 'HITs_%s-%s.journal' % (account, host))
+
+
+class CreationJournal:
+    """ Records every create_hit call of a project before and after it is made.
+
+    The journal is a JSON-lines file with four kinds of events:
+        run      : a posting run started, with its shard when the sets are
+                   shared by several accounts
+        request  : create_hit is about to be called for a set
+        created  : create_hit returned for a set
+        finished : every set of a posting (or a wave of one) has a HIT
+
+    Each set is posted with a UniqueRequestToken derived from the project,
+    account, host, run and set id, so re-sending a request after a crash
+    can never create a second HIT for the same set.
+
+    Args:
+        path(str): The journal file.
+        project_name(str): The name of the project.
+        account(str): The requester account.
+        host(str): The platform, sandbox or formal.
+    """
+
+    def __init__(self, path, project_name, account, host):
+        self.path = path
+        self.project_name = project_name
+        self.account = account
+        self.host = host
+        self.run = None
+        self.shard = None
+        self._lock = threading.Lock()
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return []
+        events = []
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    # a torn last line from a crash mid-write
+                    continue
+        return events
+
+    def start_run(self, shard=None):
+        """ Start a run, of the shard (an HSetId spec) of the account in a sharded posting. """
+        self.run = time.strftime('%Y%m%dT%H%M%S')
+        self.shard = shard
+        event = dict(event='run', project=self.project_name, account=self.account, host=self.host)
+        if shard is not None:
+            event['shard'] = shard
+        self._write(**event)
+        return self.run
+
+    def resume(self):
+        """ Re-open the last run.
+
+        The shard of a sharded run is kept in self.shard; the run has to be
+        resumed within it.
+
+        Returns:
+            created(dict): The created HIT records of the run, by set id.
+        """
+        events = self.read()
+        runs = [e for e in events if e['event'] == 'run']
+        if not runs:
+            raise RuntimeError('There is no run to resume in %s' % self.path)
+
+        self.run = runs[-1]['run']
+        self.shard = runs[-1].get('shard')
+        return {e['SetId']: e for e in events
+                if e['run'] == self.run and e['event'] == 'created'}
+
+    def created_hits(self, HITGroupId=None):
+        """ The created HIT records of every run, optionally of one HIT group only. """
+        return [e for e in self.read() if e['event'] == 'created' and
+                (HITGroupId is None or e['HITGroupId'] == HITGroupId)]
+
+    def request_token(self, set_id):
+        key = '|'.join(map(str, (self.project_name, self.account, self.host, self.run, set_id)))
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def record_request(self, set_id):
+        token = self.request_token(set_id)
+        self._write(event='request', SetId=set_id, UniqueRequestToken=token)
+        return token
+
+    def record_created(self, record):
+        self._write(event='created', SetId=record['SetId'],
+                    HITId=record['HITId'], HITGroupId=record['HITGroupId'])
+
+    def record_finished(self):
+        self._write(event='finished')
+
+    def _write(self, **event):
+        event = dict(run=self.run, time=time.time(), **event)
+        line = json.dumps(event) + '\n'
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def get_existing_hit_id(err):
+    """ The HITId in the error of a create_hit whose UniqueRequestToken was used before, or None.
+
+    MTurk reports it as a RequestError whose wording is not documented, so
+    any RequestError naming a HITId counts; only call this for a create_hit
+    sent with a UniqueRequestToken.
+    """
+    error = (getattr(err, 'response', None) or {}).get('Error', {})
+    if error.get('Code') != 'RequestError':
+        return None
+    match = re.search(r'\b[A-Z0-9]{30}\b', error.get('Message', ''))
+    return match.group(0) if match else None
@@ -0,0 +1,220 @@
+"""
+    extend, add assignments to, expire or delete posted HITs in bulk
+"""
+
+import time
+import hashlib
+import datetime
+
+from helpers import set_logging_configs, log_event, make_mtc, get_worker_count, to_timestamp
+from engine import ThrottledClient, run_concurrently
+from journal import CreationJournal, get_journal_path
+from get_assignments import get_hit_ids
+
+
+ACTIONS = ('extend', 'add', 'expire', 'delete')
+
+# a time in the past expires a HIT right away
+EXPIRE_AT = datetime.datetime(2015, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def get_add_token(HITId, n_assignments, max_assignments):
+    # the same addition to the same HIT is sent once, however often it is retried
+    return hashlib.sha1(('add|%s|%d|%d' % (HITId, n_assignments, max_assignments)).encode()).hexdigest()
+
+
+def get_hit_operation(mtc, action, hours=None, n_assignments=None):
+    """ Return a function that runs the action on a HITId and checks its result.
+
+    The function raises a RuntimeError when the HIT does not end up in the
+    expected state, and returns the HIT otherwise.
+    """
+    def get_hit(HITId):
+        return mtc.get_hit(HITId=HITId)['HIT']
+
+    if action == 'extend':
+        if not hours:
+            raise RuntimeError('A number of hours is required to extend HITs.')
+
+        def operation(HITId):
+            expire_at = time.time() + hours * 3600
+            # botocore sends naive datetimes as UTC, so the local time zone must not leak in
+            mtc.update_expiration_for_hit(
+                HITId=HITId, ExpireAt=datetime.datetime.fromtimestamp(expire_at, tz=datetime.timezone.utc))
+            hit = get_hit(HITId)
+            if to_timestamp(hit['Expiration']) < expire_at - 60:
+                raise RuntimeError('The HIT %s still expires at %s.' % (HITId, hit['Expiration']))
+            return hit
+
+    elif action == 'add':
+        if not n_assignments or n_assignments < 1:
+            raise RuntimeError('A positive number of assignments is required to add assignments.')
+        # the MaxAssignments a HIT had before the first attempt
+        max_assignments = {}
+
+        def operation(HITId):
+            if HITId not in max_assignments:
+                max_assignments[HITId] = get_hit(HITId)['MaxAssignments']
+            expected = max_assignments[HITId] + n_assignments
+            try:
+                mtc.create_additional_assignments_for_hit(
+                    HITId=HITId, NumberOfAdditionalAssignments=n_assignments,
+                    UniqueRequestToken=get_add_token(HITId, n_assignments, max_assignments[HITId]))
+            except Exception:
+                # an earlier attempt may have gone through with the same token
+                if get_hit(HITId)['MaxAssignments'] < expected:
+                    raise
+            hit = get_hit(HITId)
+            if hit['MaxAssignments'] < expected:
+                raise RuntimeError('The HIT %s has %d assignments, not %d.' % (
+                    HITId, hit['MaxAssignments'], expected))
+            return hit
+
+    elif action == 'expire':
+        def operation(HITId):
+            mtc.update_expiration_for_hit(HITId=HITId, ExpireAt=EXPIRE_AT)
+            hit = get_hit(HITId)
+            if to_timestamp(hit['Expiration']) > time.time():
+                raise RuntimeError('The HIT %s still expires at %s.' % (HITId, hit['Expiration']))
+            return hit
+
+    elif action == 'delete':
+        def operation(HITId):
+            mtc.delete_hit(HITId=HITId)
+            try:
+                hit = get_hit(HITId)
+            except Exception:
+                # deleted HITs can no longer be found
+                return None
+            if hit['HITStatus'] != 'Disposed':
+                raise RuntimeError('The HIT %s is still %s.' % (HITId, hit['HITStatus']))
+            return hit
+
+    else:
+        raise RuntimeError('The action "%s" does not exist, please use %s.' % (action, ', '.join(ACTIONS)))
+
+    return operation
+
+
+def manage_hits(mtc, HITIds, action, hours=None, n_assignments=None, dry_run=False,
+                max_workers=8, rate=5., max_rounds=3, round_delay=5., sleep=time.sleep):
+    """ Run one lifecycle action on many HITs.
+
+    HITs whose action fails, or does not leave them in the expected state,
+    are tried again in the next round, after a growing delay.
+
+    Args:
+        mtc: A mturk client.
+        HITIds(iterable): The HITs to act on.
+        action(str): extend, add, expire or delete.
+        hours(float): How many hours from now extended HITs expire in.
+        n_assignments(int): How many assignments to add to each HIT.
+        dry_run(bool): Only report what would be done.
+        max_workers(int): The number of concurrent HITs.
+        rate(float): The maximum number of calls per second.
+        max_rounds(int): The number of times a HIT is tried at most.
+        round_delay(float): Seconds before the second round, doubled every round.
+
+    Returns:
+        summary(dict): The counts of succeeded and failed HITs, the number
+            of rounds and the last error of every failure.
+    """
+    HITIds = list(dict.fromkeys(HITIds))
+    summary = dict(total=len(HITIds), succeeded=0, failed=0, rounds=0, failures={})
+
+    # check the arguments before anything is sent
+    operation = get_hit_operation(ThrottledClient(mtc, rate=rate), action,
+                                  hours=hours, n_assignments=n_assignments)
+    if dry_run:
+        summary['would_run'] = len(HITIds)
+        return summary
+
+    todo = HITIds
+    while todo and summary['rounds'] < max_rounds:
+        if summary['rounds']:
+            sleep(round_delay * 2 ** (summary['rounds'] - 1))
+        summary['rounds'] += 1
+
+        failures = {}
+        for HITId, result in run_concurrently(operation, todo, max_workers=max_workers,
+                                              return_exceptions=True):
+            if isinstance(result, Exception):
+                failures[HITId] = str(result)
+            else:
+                summary['succeeded'] += 1
+        todo = list(failures)
+        summary['failures'] = failures
+
+    summary['failed'] = len(summary['failures'])
+    return summary
+
+
+def get_summary_review(action, summary):
+    review = ('\n%s summary\n' % action.capitalize() +
+              '  HITs      : %d\n' % summary['total'])
+    if 'would_run' in summary:
+        return review + '  Dry run   : %d would be sent\n' % summary['would_run']
+
+    review += ('  Rounds    : %d\n' % summary['rounds'] +
+               '  Succeeded : %d\n' % summary['succeeded'] +
+               '  Failed    : %d\n' % summary['failed'])
+    for HITId, error in summary['failures'].items():
+        review += '    %s : %s\n' % (HITId, error)
+    return review
+
+
+if __name__ == '__main__':
+    import argparse
+
+    # create parser object
+    parser = argparse.ArgumentParser()
+    parser.add_argument('action', choices=ACTIONS,
+                        help='Extend, add assignments to, expire or delete the HITs?')
+    parser.add_argument('--account', type=str,
+                        help='Which requester account to use?')
+    parser.add_argument('--host', type=str, default='sandbox',
+                        help='Which platform to host, sandbox or formal?')
+    parser.add_argument('--hit_ids', type=str, nargs='*',
+                        help='Which HITs to act on?')
+    parser.add_argument('--group', type=str,
+                        help='Which HIT group to act on?')
+    parser.add_argument('--project', type=str,
+                        help='Which project journal to take the HITs (of the group) from?')
+    parser.add_argument('--hours', type=float,
+                        help='How many hours from now should extended HITs expire in?')
+    parser.add_argument('--assignments', type=int,
+                        help='How many assignments to add to each HIT?')
+    parser.add_argument('--dry_run', action='store_true',
+                        help='Only report what would be done?')
+    parser.add_argument('--rounds', type=int, default=3,
+                        help='How many times to try a HIT at most?')
+    parser.add_argument('--workers', type=get_worker_count, default=8,
+                        help='How many HITs to act on concurrently?')
+    parser.add_argument('--rate', type=float, default=5.,
+                        help='How many calls per second at most?')
+
+    # parse terminal inputs
+    args = parser.parse_args()
+    if not args.hit_ids and not args.group and not args.project:
+        parser.error('either --hit_ids, --group or --project is required')
+
+    logger = set_logging_configs(__name__)
+    mtc = make_mtc(args.account, args.host)
+
+    journal = None
+    if args.project:
+        from post_hits import get_project_path
+        journal = CreationJournal(
+            get_journal_path(get_project_path(args.project), args.account, args.host),
+            args.project, args.account, args.host)
+
+    if args.hit_ids or args.group:
+        HITIds = get_hit_ids(mtc, args.hit_ids, args.group, journal=journal)
+    else:
+        HITIds = [hit['HITId'] for hit in journal.created_hits()]
+
+    summary = manage_hits(mtc, HITIds, args.action, hours=args.hours, n_assignments=args.assignments,
+                          dry_run=args.dry_run, max_workers=args.workers, rate=args.rate,
+                          max_rounds=args.rounds)
+    logger.info(get_summary_review(args.action, summary))
+    log_event(logger, args.action, **{k: v for k, v in summary.items() if k != 'failures'})
@@ -0,0 +1,157 @@
+"""
+    per-operation metrics of mturk API calls
+"""
+
+import json
+import time
+import threading
+from collections import defaultdict
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(q / 100. * (len(values) - 1)))))
+    return values[index]
+
+
+class ApiMetrics:
+    """ Count, latency, retries, throttles and bytes sent of every mturk operation.
+
+    Recording hooks into the botocore event system of a client:
+        before-call    : an operation starts
+        before-send    : an HTTP attempt is sent (counts attempts and bytes)
+        needs-retry    : an attempt finished (counts throttled attempts)
+        after-call     : an operation returned or failed with an error response
+        after-call-error : an operation failed without a response
+    botocore does not retry, the engine does: every retry it makes is
+    recorded with record_retry, and the attempts it retried are not
+    counted as calls or errors of their own. Named steps outside the API,
+    like loading credentials, can be timed too.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.operations = defaultdict(lambda: dict(count=0, errors=0, attempts=0, retries=0,
+                                                       throttles=0, bytes_sent=0, latencies=[]))
+            self.steps = defaultdict(float)
+
+    def attach(self, mtc):
+        events = getattr(getattr(mtc, 'meta', None), 'events', None)
+        if events is None:
+            return mtc
+
+        service = 'mturk'
+        events.register('before-call.%s' % service, self._before_call)
+        events.register('before-send.%s' % service, self._before_send)
+        # the retry handler stops the emission once it asks for a retry, so go first
+        events.register_first('needs-retry.%s' % service, self._needs_retry)
+        events.register('after-call.%s' % service, self._after_call)
+        events.register('after-call-error.%s' % service, self._after_call_error)
+        return mtc
+
+    def record_retry(self, operation_name):
+        with self._lock:
+            self.operations[operation_name]['retries'] += 1
+
+    def record_step(self, name, seconds):
+        with self._lock:
+            self.steps[name] += seconds
+
+    def timed(self, name, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.record_step(name, time.perf_counter() - start)
+
+    # botocore event handlers
+    @staticmethod
+    def _operation_name(event_name):
+        return event_name.rsplit('.', 1)[-1]
+
+    def _before_call(self, context=None, **kwargs):
+        if context is not None:
+            context['metrics_started_at'] = time.perf_counter()
+
+    def _before_send(self, request=None, event_name='', **kwargs):
+        body = getattr(request, 'body', None) or b''
+        with self._lock:
+            operation = self.operations[self._operation_name(event_name)]
+            operation['attempts'] += 1
+            operation['bytes_sent'] += len(body)
+
+    def _needs_retry(self, response=None, event_name='', **kwargs):
+        if response is None:
+            return None
+        _, parsed = response
+        code = (parsed or {}).get('Error', {}).get('Code', '')
+        if 'Throttl' in code or code == 'RequestLimitExceeded':
+            with self._lock:
+                self.operations[self._operation_name(event_name)]['throttles'] += 1
+        # let the retry handler decide
+        return None
+
+    def _finish(self, event_name, context, is_error):
+        started_at = (context or {}).pop('metrics_started_at', None)
+        with self._lock:
+            operation = self.operations[self._operation_name(event_name)]
+            operation['count'] += 1
+            operation['errors'] += int(is_error)
+            if started_at is not None:
+                operation['latencies'].append(time.perf_counter() - started_at)
+
+    def _after_call(self, parsed=None, context=None, event_name='', **kwargs):
+        self._finish(event_name, context, is_error='Error' in (parsed or {}))
+
+    def _after_call_error(self, context=None, event_name='', **kwargs):
+        self._finish(event_name, context, is_error=True)
+
+    # reports
+    def summarize(self):
+        with self._lock:
+            operations = {}
+            for name, operation in self.operations.items():
+                latencies = sorted(operation['latencies'])
+                summary = {k: v for k, v in operation.items() if k != 'latencies'}
+                # a retried attempt went through botocore as a failed call of its own
+                summary['count'] = max(0, operation['count'] - operation['retries'])
+                summary['errors'] = max(0, operation['errors'] - operation['retries'])
+                summary['retries'] += max(0, operation['attempts'] - operation['count'])
+                summary['latency'] = dict(
+                    total=sum(latencies),
+                    min=latencies[0] if latencies else None,
+                    max=latencies[-1] if latencies else None,
+                    p50=_percentile(latencies, 50),
+                    p95=_percentile(latencies, 95),
+                    p99=_percentile(latencies, 99))
+                operations[name] = summary
+            return dict(steps=dict(self.steps), operations=operations)
+
+    def get_review(self):
+        summary = self.summarize()
+        review = '\nAPI calls\n'
+        for name, seconds in summary['steps'].items():
+            review += '  %-34s %9.3f s\n' % (name, seconds)
+
+        review += '  %-34s %6s %6s %6s %6s %9s %9s %9s %10s\n' % (
+            'operation', 'calls', 'errors', 'retry', 'thrtl', 'total s', 'p50 ms', 'p99 ms', 'bytes')
+        for name, operation in sorted(summary['operations'].items()):
+            latency = operation['latency']
+            review += '  %-34s %6d %6d %6d %6d %9.3f %9.1f %9.1f %10d\n' % (
+                name, operation['count'], operation['errors'], operation['retries'],
+                operation['throttles'], latency['total'],
+                (latency['p50'] or 0) * 1000, (latency['p99'] or 0) * 1000, operation['bytes_sent'])
+        return review
+
+    def save(self, file_path, **run_info):
+        with open(file_path, 'w') as f:
+            json.dump(dict(run_info, **self.summarize()), f, indent=2)
+
+
+# the metrics of every client built by make_mtc
+API_METRICS = ApiMetrics()
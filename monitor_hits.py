@@ -0,0 +1,217 @@
+"""
+    monitor the progress of posted HITs
+"""
+
+import time
+
+from helpers import set_logging_configs, log_event, make_mtc, get_worker_count, to_timestamp
+from engine import ThrottledClient, run_concurrently
+from journal import CreationJournal, get_journal_path
+
+
+# HITs in these statuses take no more workers
+FINISHED_HIT_STATUSES = ('Reviewable', 'Reviewing', 'Disposed')
+
+
+class HitIndex:
+    """ The latest state of every monitored HIT and the totals over them.
+
+    The totals are updated by the difference a new state makes, so a poll
+    costs as much as the HITs it returns and the index is never rescanned.
+    Finished HITs are not polled again; a HIT whose get_hit keeps failing,
+    e.g. a deleted one, counts as finished with its error.
+    """
+
+    COUNTS = ('available', 'pending', 'submitted', 'completed')
+    # consecutive failed polls before a HIT is given up on
+    MAX_ERRORS = 3
+
+    def __init__(self, HITIds):
+        self.states = dict.fromkeys(HITIds)
+        self.totals = dict.fromkeys(self.COUNTS, 0)
+        self.finished = set()
+        self.errors = {}
+        self.error_counts = {}
+
+    def __len__(self):
+        return len(self.states)
+
+    @staticmethod
+    def get_state(hit):
+        available = hit['NumberOfAssignmentsAvailable']
+        pending = hit['NumberOfAssignmentsPending']
+        completed = hit['NumberOfAssignmentsCompleted']
+        # submitted assignments are neither available, pending nor reviewed
+        submitted = max(0, hit['MaxAssignments'] - available - pending - completed)
+        return dict(status=hit['HITStatus'], expiration=to_timestamp(hit.get('Expiration')),
+                    available=available, pending=pending, submitted=submitted, completed=completed)
+
+    @staticmethod
+    def is_finished(state, now):
+        if state['pending']:
+            return False
+        return (state['status'] in FINISHED_HIT_STATUSES or not state['available'] or
+                (state['expiration'] is not None and state['expiration'] <= now))
+
+    def update(self, hit, now=None):
+        """ Record the state of a HIT.
+
+        Returns:
+            changed(bool): Whether the state differs from the last one.
+        """
+        HITId = hit['HITId']
+        state = self.get_state(hit)
+        old_state = self.states.get(HITId)
+        changed = state != old_state
+        if changed:
+            for name in self.COUNTS:
+                self.totals[name] += state[name] - (old_state[name] if old_state else 0)
+            self.states[HITId] = state
+
+        # a HIT can run out of time without any change of its state
+        if self.is_finished(state, time.time() if now is None else now):
+            self.finished.add(HITId)
+        return changed
+
+    def record_error(self, HITId, err):
+        """ Record a failed poll of a HIT, finishing the HIT after MAX_ERRORS in a row. """
+        self.errors[HITId] = str(err)
+        self.error_counts[HITId] = self.error_counts.get(HITId, 0) + 1
+        if self.error_counts[HITId] >= self.MAX_ERRORS:
+            self.finished.add(HITId)
+
+    def add(self, HITIds):
+        """ Monitor more HITs, from the next poll on. """
+        for HITId in HITIds:
+            self.states.setdefault(HITId, None)
+
+    def reopen(self, HITId):
+        """ Poll a finished HIT again, e.g. after its expiration is extended. """
+        self.finished.discard(HITId)
+        self.error_counts.pop(HITId, None)
+
+    def get_active_hit_ids(self):
+        return [HITId for HITId in self.states if HITId not in self.finished]
+
+
+def poll_hits(mtc, index, max_workers=8):
+    """ get_hit every HIT of the index that is not finished, concurrently.
+
+    Returns:
+        changed(int): The number of HITs whose state changed.
+    """
+    def get_hit(HITId):
+        return mtc.get_hit(HITId=HITId)['HIT']
+
+    now = time.time()
+    changed = 0
+    for HITId, result in run_concurrently(get_hit, index.get_active_hit_ids(),
+                                          max_workers=max_workers, return_exceptions=True):
+        if isinstance(result, Exception):
+            index.record_error(HITId, result)
+            continue
+        index.errors.pop(HITId, None)
+        index.error_counts.pop(HITId, None)
+        changed += index.update(result, now=now)
+    return changed
+
+
+def monitor_hits(mtc, HITIds, interval=10., max_interval=300., backoff=2., max_workers=8,
+                 rate=5., max_polls=None, sleep=time.sleep):
+    """ Poll the HITs until every one is finished.
+
+    The wait goes back to interval after a poll that changed something, and
+    grows by backoff up to max_interval after a poll that did not.
+
+    Yields:
+        (index, changed, wait): The HitIndex, the number of HITs changed by
+            the poll and the seconds until the next poll, None after the last.
+    """
+    mtc = ThrottledClient(mtc, rate=rate)
+    index = HitIndex(HITIds)
+    wait = interval
+    polls = 0
+    while True:
+        changed = poll_hits(mtc, index, max_workers=max_workers)
+        polls += 1
+        if changed:
+            wait = interval
+        elif polls > 1:
+            wait = min(wait * backoff, max_interval)
+
+        if not index.get_active_hit_ids() or (max_polls and polls >= max_polls):
+            yield index, changed, None
+            return
+        yield index, changed, wait
+        sleep(wait)
+
+
+PROGRESS_HEADER = '%8s %13s %9s %9s %9s %9s %7s %6s %8s' % (
+    'time', 'HITs done', 'avail', 'pending', 'submit', 'reviewed', 'done %', 'errors', 'next (s)')
+
+
+def get_progress_row(index, wait):
+    totals = index.totals
+    n_assignments = sum(totals.values())
+    done = totals['submitted'] + totals['completed']
+    return '%8s %13s %9d %9d %9d %9d %7.1f %6d %8s' % (
+        time.strftime('%H:%M:%S'), '%d/%d' % (len(index.finished), len(index)),
+        totals['available'], totals['pending'], totals['submitted'], totals['completed'],
+        100. * done / n_assignments if n_assignments else 0., len(index.errors),
+        '-' if wait is None else '%d' % wait)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    # create parser object
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--account', type=str,
+                        help='Which requester account to use?')
+    parser.add_argument('--host', type=str, default='sandbox',
+                        help='Which platform to host, sandbox or formal?')
+    parser.add_argument('--project', type=str,
+                        help='Which project journal to take the HITs from?')
+    parser.add_argument('--group', type=str,
+                        help='Which HIT group of the journal to monitor?')
+    parser.add_argument('--hit_ids', type=str, nargs='*',
+                        help='Which HITs to monitor?')
+    parser.add_argument('--interval', type=float, default=10.,
+                        help='How many seconds between polls at least?')
+    parser.add_argument('--max_interval', type=float, default=300.,
+                        help='How many seconds between polls at most?')
+    parser.add_argument('--workers', type=get_worker_count, default=8,
+                        help='How many HITs to poll concurrently?')
+    parser.add_argument('--rate', type=float, default=5.,
+                        help='How many get_hit calls per second at most?')
+    parser.add_argument('--once', action='store_true',
+                        help='Poll only once?')
+
+    # parse terminal inputs
+    args = parser.parse_args()
+
+    if args.hit_ids:
+        HITIds = args.hit_ids
+    elif args.project:
+        from post_hits import get_project_path
+        journal = CreationJournal(
+            get_journal_path(get_project_path(args.project), args.account, args.host),
+            args.project, args.account, args.host)
+        HITIds = [hit['HITId'] for hit in journal.created_hits(args.group)]
+    else:
+        parser.error('either --hit_ids or --project is required')
+    if not HITIds:
+        parser.error('there are no HITs to monitor')
+
+    logger = set_logging_configs(__name__)
+    logger.info('\nMonitoring %d HITs\n' % len(HITIds) + PROGRESS_HEADER)
+    for index, changed, wait in monitor_hits(make_mtc(args.account, args.host), HITIds,
+                                             interval=args.interval, max_interval=args.max_interval,
+                                             max_workers=args.workers, rate=args.rate,
+                                             max_polls=1 if args.once else None):
+        logger.info(get_progress_row(index, wait))
+        log_event(logger, 'poll', changed=changed, finished=len(index.finished),
+                  errors=len(index.errors), **index.totals)
+
+    for HITId, error in index.errors.items():
+        logger.info('  %s : %s' % (HITId, error))
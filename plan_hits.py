@@ -0,0 +1,246 @@
+"""
+    compile a HIT.config into a posting plan, and post a plan
+"""
+
+import os
+import json
+import time
+import hashlib
+
+from helpers import (set_logging_configs, log_event, flush_logging, make_mtc, is_confirmed,
+                     get_available_balance, get_worker_count)
+from journal import CreationJournal, get_journal_path
+from qualification_cache import QualificationCache
+from preflight import Preflight
+from metrics import API_METRICS
+from post_hits import (CONFIG_FILE, get_project_path, get_project_log_path, get_hit_kwargs_builder,
+                       prepare_project, post_hit_sets, get_cost, get_balance_review,
+                       log_created_review)
+
+
+PLAN_VERSION = 1
+
+
+def get_plan_path(project_path, account, host):
+    return os.path.join(project_path, '.log', 'HITs_%s-%s.plan.json' % (account, host))
+
+
+def get_file_hash(file_path):
+    with open(file_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def get_plan_hash(plan):
+    content = {k: v for k, v in plan.items() if k != 'hash'}
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def compile_plan(project_name, account, host, use_cache=True, cache_ttl=3600):
+    """ Compile the config of a project into a posting plan.
+
+    The config is checked and every qualification type is looked up, as
+    postHITs does, and the create_hit kwargs of every set are rendered.
+
+    Returns:
+        plan(dict): The kwargs, the ExternalQuestion XML of every set, the
+            cost, the reviews to show and the hash of the rest of the plan.
+    """
+    with Preflight() as preflight:
+        mtc_future = preflight.submit('make_mtc', make_mtc, account, host)
+        cache = QualificationCache(account, host, ttl=cache_ttl) if use_cache else None
+        project = prepare_project(project_name, account, host, preflight, mtc_future, cache=cache)
+        qualification_reviews = [future.result() for future in project['review_futures']]
+
+    build_hit_kwargs = get_hit_kwargs_builder(
+        project_name, project['description_kwargs'], project['setup_kwargs'],
+        project['requirement_kwarg_list'], with_hit_set=project['with_hit_set'])
+    questions = [[set_id, build_hit_kwargs(set_id)['Question']] for set_id in project['hit_set_ids']]
+
+    plan = dict(version=PLAN_VERSION, project=project_name, account=account, host=host,
+                title=project['title'], compiled_at=time.strftime('%Y-%m-%d %H:%M:%S'),
+                config_hash=get_file_hash(os.path.join(get_project_path(project_name), CONFIG_FILE)),
+                description_kwargs=project['description_kwargs'], setup_kwargs=project['setup_kwargs'],
+                requirements=project['requirement_kwarg_list'],
+                hit_set_ids=str(project['hit_set_ids']), questions=questions,
+                cost=get_cost(project['setup_kwargs'], len(questions)),
+                reviews=[project['description_review'], project['setup_review'],
+                         project['requirement_review']] + qualification_reviews)
+    plan['hash'] = get_plan_hash(plan)
+    return plan
+
+
+def save_plan(plan, file_path):
+    tmp_path = '%s.%d.tmp' % (file_path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(plan, f)
+    os.replace(tmp_path, file_path)
+
+
+def load_plan(file_path):
+    """ Read a plan and check that it has not been changed since it was compiled. """
+    with open(file_path) as f:
+        plan = json.load(f)
+
+    if plan.get('version') != PLAN_VERSION:
+        raise RuntimeError('The plan %s is of version %s, please compile it again.' % (
+            file_path, plan.get('version')))
+    if plan.get('hash') != get_plan_hash(plan):
+        raise RuntimeError('The plan %s has been changed since it was compiled.' % file_path)
+    return plan
+
+
+def get_plan_review(plan):
+    cost = plan['cost']
+    return ('\nPlan %s\n' % plan['hash'][:12] +
+            '  Name      : %s\n' % plan['title'] +
+            '  Host      : %s %s\n' % (plan['account'], plan['host']) +
+            '  Compiled  : %s\n' % plan['compiled_at'] +
+            ('  HSetId    : %s (%d sets)\n' % (plan['hit_set_ids'], cost['n_sets']) if cost['n_sets'] > 1 else '') +
+            '  N Workers : %d = %d (assignment) * %d (set)\n' % (
+                cost['n_workers'], cost['n_assignments'], cost['n_sets']) +
+            '  Cost      : $%.2f\n' % cost['total_cost'])
+
+
+def apply_plan(plan, save_log=False, max_workers=8, rate=5., resume=False):
+    """ Post the HITs of a plan, without reading the config again.
+
+    Args:
+        plan(dict): A plan of compile_plan or load_plan.
+        Other arguments are the ones of postHITs.
+
+    Returns:
+        HITIds(list): A list of HITIDs of created HITS.
+    """
+    project_name, account, host = plan['project'], plan['account'], plan['host']
+    project_path = get_project_path(project_name)
+    project_log_path = get_project_log_path(project_path)
+    journal = CreationJournal(get_journal_path(project_path, account, host),
+                              project_name, account, host)
+
+    if save_log:
+        save_log_path = os.path.join(project_log_path, 'HITs_%s-%s.log' % (account, host))
+        logger = set_logging_configs(__name__, save_log_path=save_log_path)
+        logger.info("\napply_plan(%s, %s, host='%s', plan=%s, resume=%s)\n" % (
+            project_name, account, host, plan['hash'][:12], resume))
+    else:
+        logger = set_logging_configs(__name__)
+
+    API_METRICS.reset()
+    with Preflight() as preflight:
+        mtc_future = preflight.submit('make_mtc', make_mtc, account, host)
+        if host == 'formal':
+            def get_account_balance():
+                return get_available_balance(mtc_future.result())
+            balance_future = preflight.submit('get_account_balance', get_account_balance)
+
+        for review in plan['reviews']:
+            logger.info(review)
+        logger.info(get_plan_review(plan))
+        if get_file_hash(os.path.join(project_path, CONFIG_FILE)) != plan['config_hash']:
+            logger.warning('\n!!! %s has been changed since the plan was compiled !!!\n' % CONFIG_FILE)
+
+        questions = {set_id: question for set_id, question in plan['questions']}
+        hit_set_ids = list(questions)
+        previously_created = {}
+        if resume:
+            previously_created = journal.resume()
+            hit_set_ids = [x for x in hit_set_ids if x not in previously_created]
+            logger.info('\nResuming run %s: %d sets already created, %d sets to go.\n' % (
+                journal.run, len(previously_created), len(hit_set_ids)))
+            if not hit_set_ids:
+                logger.info('\nAll sets of run %s have been created, nothing to resume.\n' % journal.run)
+                return [previously_created[x]['HITId'] for x in questions if x in previously_created]
+
+        if host == 'formal':
+            cost = get_cost(plan['setup_kwargs'], len(hit_set_ids))
+            logger.info(get_balance_review(account, host, balance_future.result(), cost['total_cost']))
+
+        mtc = mtc_future.result()
+        logger.info(preflight.get_timings_review())
+    flush_logging(__name__)
+
+    # action required: check the above information and decide whether to proceed or not
+    notice = '\nDo you want to proceed to publish %s for %s %s? [y/n]: ' % (project_name, account.upper(), host.upper())
+    if not is_confirmed(notice):
+        logger.info('\nThe task is cancelled, quiting now ...\n' +
+                    '\n----------------------------------\n')
+        log_event(logger, 'cancelled', project=project_name)
+        return
+
+    if not resume:
+        journal.start_run()
+    log_event(logger, 'plan', project=project_name, hash=plan['hash'], run=journal.run)
+
+    def build_hit_kwargs(set_id):
+        return dict(Question=questions[set_id], **plan['description_kwargs'], **plan['setup_kwargs'],
+                    QualificationRequirements=plan['requirements'])
+
+    created = post_hit_sets(mtc, journal, hit_set_ids, build_hit_kwargs,
+                            max_workers=max_workers, rate=rate,
+                            on_created=lambda hit: log_event(logger, 'hit_created', **hit))
+    created_by_set = {**previously_created, **{hit['SetId']: hit for hit in created}}
+    created = [created_by_set[x] for x in questions if x in created_by_set]
+    log_created_review(logger, dict(name=project_name, journal=journal), created, host)
+
+    logger.info(API_METRICS.get_review())
+    if save_log:
+        API_METRICS.save(os.path.splitext(save_log_path)[0] + '.metrics.json',
+                         project=project_name, account=account, host=host, plan=plan['hash'],
+                         time=time.strftime('%Y-%m-%d %H:%M:%S'), n_hits=len(created))
+    return [hit['HITId'] for hit in created]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    # create parser object
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['plan', 'apply'],
+                        help='Compile a plan, or post a compiled plan?')
+    parser.add_argument('--project', type=str,
+                        help='Which project to use?')
+    parser.add_argument('--account', type=str,
+                        help='Which requester account to use?')
+    parser.add_argument('--host', type=str, default='sandbox',
+                        help='Which platform to host, sandbox or formal?')
+    parser.add_argument('--plan', type=str,
+                        help='Which plan file to write or post, the one in the project .log if not given?')
+    parser.add_argument('--save_log', type=int, default=0,
+                        help='Save a log file or not?')
+    parser.add_argument('--workers', type=get_worker_count, default=8,
+                        help='How many HITs to create concurrently?')
+    parser.add_argument('--rate', type=float, default=5.,
+                        help='How many create_hit calls per second at most?')
+    parser.add_argument('--no_cache', action='store_true',
+                        help='Look up qualification types again instead of using the cache?')
+    parser.add_argument('--resume', action='store_true',
+                        help='Only post the sets that the last run did not create?')
+
+    # parse terminal inputs
+    args = parser.parse_args()
+
+    if args.command == 'plan' and (not args.project or not args.account):
+        parser.error('--project and --account are required to compile a plan')
+
+    plan_path = args.plan
+    if plan_path is None:
+        if not args.project or not args.account:
+            parser.error('either --plan or --project and --account are required')
+        project_path = get_project_path(args.project)
+        get_project_log_path(project_path)
+        plan_path = get_plan_path(project_path, args.account, args.host)
+
+    if args.command == 'plan':
+        logger = set_logging_configs(__name__)
+        plan = compile_plan(args.project, args.account, args.host, use_cache=not args.no_cache)
+        save_plan(plan, plan_path)
+        for review in plan['reviews']:
+            logger.info(review)
+        logger.info(get_plan_review(plan) + '\nThe plan is saved in %s\n' % plan_path)
+
+    elif args.command == 'apply':
+        plan = load_plan(plan_path)
+        # save the log if running actual mturk experiment
+        save_log = True if plan['host'] == 'formal' else args.save_log
+        apply_plan(plan, save_log=save_log, max_workers=args.workers, rate=args.rate,
+                   resume=args.resume)
@@ -3,13 +3,21 @@
 """
 
 import os
-import boto3
+import glob
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from helpers import (check_file_exists, set_logging_configs, read_config,
-                     make_mtc, is_confirmed, ExternalQuestion,
+from helpers import (check_file_exists, set_logging_configs, log_event, flush_logging, read_config,
+                     make_mtc, get_worker_count, is_confirmed, ExternalQuestion,
                      get_hit_descriptions, get_hit_setups, get_hit_set_ids,
                      get_review, get_qualification_requirements,
-                     get_hit_url, get_preview_url, get_aws_shell_list_hits)
+                     get_hit_url, get_preview_url, get_available_balance, HSetIdRange, parse_HSetId_str,
+                     REQUESTER_ACCOUNTS)
+from engine import RateLimiter, create_hits, summarize_latencies
+from journal import CreationJournal, get_existing_hit_id, get_journal_path
+from qualification_cache import QualificationCache
+from preflight import Preflight
+from metrics import API_METRICS
 
 
 # hard coded variables
@@ -20,197 +28,703 @@ WORK_PATH = '/Volumes/turk/'
 CONFIG_FILE = 'HIT.config'
 TEST_SETUPS = dict(reward='0', max_assignments='1', assignment_duration_in_mins='60',
                    lifetime_in_hours='1', auto_approval_delay_in_hours='0')
+# larger postings only point to the journal for their HITIds
+MAX_LOGGED_HITIDS = 500
 
 
-def postHITs(project_name, account, host, save_log=False):
+def get_project_path(project_name):
+    return os.path.join(WORK_PATH, 'experiments', EXPERIMENTER, project_name)
+
+
+def get_hit_kwargs_builder(project_name, description_kwargs, setup_kwargs,
+                           requirement_kwarg_list, with_hit_set=True):
+    """ Return a function that gives the create_hit kwargs of a set id. """
+    landing_url = get_hit_url(project_name, EXPERIMENTER, LANDING_FILE)
+
+    def build_hit_kwargs(set_id):
+        hit_url = landing_url + ('?HSetId=' + str(set_id) if with_hit_set else '')
+
+        question = ExternalQuestion(external_url=hit_url).get_as_xml()
+        return dict(Question=question,
+                    **description_kwargs, **setup_kwargs,
+                    QualificationRequirements=requirement_kwarg_list)
+    return build_hit_kwargs
+
+
+def post_hit_sets(mtc, journal, hit_set_ids, build_hit_kwargs, max_workers=8, rate=5.,
+                  on_created=None, limiter=None, on_failed=None):
+    """ Create one HIT per set, journaling every create_hit call.
+
+    The journal run has to be started (or resumed) by the caller. on_created
+    is called with each created HIT record after it is journaled. A limiter
+    shares the create_hit rate with other postings. With on_failed, the sets
+    that fail are reported to it instead of stopping the posting, and the
+    run is left unfinished so that a resume posts them.
+
+    Returns:
+        created(list): The created HIT records, in set order.
+    """
+    def build_journaled_kwargs(set_id):
+        return dict(build_hit_kwargs(set_id), UniqueRequestToken=journal.record_request(set_id))
+
+    def create_hit(**kwargs):
+        try:
+            return mtc.create_hit(**kwargs)
+        except Exception as err:
+            # the request went through before a crash, fetch the HIT it created
+            HITId = get_existing_hit_id(err)
+            if HITId is None:
+                raise
+            return mtc.get_hit(HITId=HITId)
+
+    def record_created(hit):
+        journal.record_created(hit)
+        if on_created is not None:
+            on_created(hit)
+
+    failed = []
+
+    def record_failed(set_id, err):
+        failed.append(set_id)
+        on_failed(set_id, err)
+
+    created = create_hits(mtc, hit_set_ids, build_journaled_kwargs,
+                          max_workers=max_workers, rate=rate, limiter=limiter,
+                          on_created=record_created, create_func=create_hit,
+                          on_failed=record_failed if on_failed is not None else None)
+    if not failed:
+        journal.record_finished()
+    return created
+
+
+def get_project_log_path(project_path):
+    # the creation journal is always kept in the .log directory
+    project_log_path = os.path.join(project_path, '.log')
+    if not os.path.exists(project_log_path):
+        os.mkdir(project_log_path)
+    return project_log_path
+
+
+def get_cost(setup_kwargs, n_sets):
+    """ The number of workers and the cost of posting n_sets sets. """
+    n_assignments = setup_kwargs['MaxAssignments']
+    n_workers = n_assignments * n_sets
+
+    reward = float(setup_kwargs['Reward'])
+    service_fee = reward * (0.2 if n_assignments < 10 else 0.4)
+    total_cost = n_workers * (reward + service_fee)
+    return dict(n_assignments=n_assignments, n_sets=n_sets, n_workers=n_workers,
+                reward=reward, service_fee=service_fee, total_cost=total_cost)
+
+
+def get_balance_review(account, host, account_balance, total_cost):
+    return ('\nAccount balance of %s %s\n' % (account, host) +
+            '  Before HIT : $%.2f\n' % account_balance +
+            '  After HIT  : $%.2f\n' % (account_balance - total_cost))
+
+
+def prepare_project(project_name, account, host, preflight, mtc_future, resume=False, cache=None):
+    """ Read and check the config of a project, and start its qualification lookups.
+
+    Config errors are raised. The qualification lookups run on the preflight
+    pool; their reviews are futures in the returned project.
+
+    Returns:
+        project(dict): The create_hit kwargs, set ids, journal and reviews of the project.
+    """
+    # make sure that project directory and files exist
+    project_path = get_project_path(project_name)
+    check_file_exists(project_path, LANDING_FILE)
+    check_file_exists(project_path, CONFIG_FILE)
+
+    get_project_log_path(project_path)
+    journal = CreationJournal(get_journal_path(project_path, account, host),
+                              project_name, account, host)
+
+    # read configuration settings
+    config = preflight.run('read_config %s' % project_name, read_config, project_path, CONFIG_FILE)
+
+    # whether running a test
+    if host == 'sandbox':
+        test_mode = 1  # testing in https://workersandbox.mturk.com/
+    elif config.has_section('TEST'):
+        test_mode = 2  # testing in https://worker.mturk.com/
+    else:
+        test_mode = 0
+
+    # description settings
+    description_kwargs = get_hit_descriptions(config['INFO'])
+    description_review = get_review('description', config['INFO'])
+
+    # setups settings
+    if test_mode:
+        config['SETUP'] = TEST_SETUPS
+    setup_kwargs = get_hit_setups(config['SETUP'])
+    setup_review = get_review('setup', config['SETUP'])
+
+    if config.has_section('HITSET'):
+        hit_set_ids = get_hit_set_ids(config['HITSET'])
+    else:
+        hit_set_ids = HSetIdRange([(0, 0)])
+
+    # skip the sets that have been created by the last run
+    all_hit_set_ids = hit_set_ids
+    previously_created = {}
+    resume_review = ''
+    if resume:
+        previously_created = journal.resume()
+        if journal.shard is not None:
+            # the other sets of a sharded run belong to other accounts
+            all_hit_set_ids = hit_set_ids = parse_HSetId_str(journal.shard) if journal.shard else HSetIdRange()
+        hit_set_ids = hit_set_ids.difference(previously_created)
+        resume_review = '\nResuming run %s%s: %d sets already created, %d sets to go.\n' % (
+            journal.run, ' (shard %s)' % journal.shard if journal.shard is not None else '',
+            len(previously_created), len(hit_set_ids))
+
+    # qualification requirement settings
+    if not test_mode:
+        requirement_review = "\nSpecify any additional qualifications Workers must meet ...\n"
+    else:
+        environments = {1: 'SANDBOX', 2: 'FORMAL'}
+        requirement_review = ('\nYou are testing in a %s environment.\n' % environments.get(test_mode) +
+                              'Qualification requirements are skipped')
+        requirement_review += ' except for the testing qualification.\n\n' if test_mode == 2 else '.\n'
+
+    requirement_kwarg_list = []
+    # percent assignments approved
+    if config.has_section('PERCENT APPROVED') and not test_mode:
+        args = ('percent_assignments_approved', config['PERCENT APPROVED'])
+        requirement_review += get_review(*args)
+        requirement_kwarg_list.append(
+            get_qualification_requirements(*args)
+        )
+        del args
+
+    # num hit approved
+    if config.has_section('NUM APPROVED') and not test_mode:
+        args = ('num_hit_approved', config['NUM APPROVED'])
+        requirement_review += get_review(*args)
+        requirement_kwarg_list.append(
+            get_qualification_requirements(*args)
+        )
+        del args
+
+    # location (Country)
+    if config.has_section('LOCATION') and not test_mode:
+        args = ('location', config['LOCATION'])
+        requirement_review += get_review(*args)
+        requirement_kwarg_list.append(
+            get_qualification_requirements(*args)
+        )
+        del args
+
+    # qualification types whose workers need to be looked up
+    qualification_args = []
+
+    # exclude the participants who have completed a previous task
+    if config.has_section('EXCLUDE QUALIFICATION TYPE') and not test_mode:
+        qualification_args.append(('exclude_qualification_type',
+                                   config['EXCLUDE QUALIFICATION TYPE']))
+
+    # only include the participants who have a specific qualification type
+    if config.has_section('INCLUDE QUALIFICATION TYPE') and not test_mode:
+        qualification_args.append(('include_qualification_type',
+                                   config['INCLUDE QUALIFICATION TYPE']))
+
+    if test_mode == 2:
+        qualification_args = [('include_qualification_type', config['TEST'])]
+        requirement_kwarg_list = []
+
+    requirement_kwarg_list += [get_qualification_requirements(*args)
+                               for args in qualification_args]
+
+    # look up all qualification types at once, as soon as the client is ready
+    def get_qualification_review(args):
+        return get_review(*args, mtc=mtc_future.result(), cache=cache)
+
+    review_futures = [preflight.submit('qualification %s' % args[1]['id'],
+                                       get_qualification_review, args)
+                      for args in qualification_args]
+
+    return dict(name=project_name, title=config['INFO']['title'], journal=journal,
+                description_kwargs=description_kwargs, setup_kwargs=setup_kwargs,
+                requirement_kwarg_list=requirement_kwarg_list,
+                with_hit_set=config.has_section('HITSET'),
+                hit_set_ids=hit_set_ids, all_hit_set_ids=all_hit_set_ids,
+                previously_created=previously_created,
+                description_review=description_review, setup_review=setup_review,
+                resume_review=resume_review, requirement_review=requirement_review,
+                review_futures=review_futures)
+
+
+def log_project_review(logger, project, account, host):
+    """ Log the reviews of a prepared project, each qualification review as it arrives. """
+    log_event(logger, 'description', project['description_review'], **project['description_kwargs'])
+    log_event(logger, 'setup', project['setup_review'], **project['setup_kwargs'])
+    if project['resume_review']:
+        logger.info(project['resume_review'])
+
+    # render each review as it arrives, in config order
+    logger.info(project['requirement_review'])
+    for future in project['review_futures']:
+        logger.info(future.result())
+    log_event(logger, 'requirements', QualificationRequirements=project['requirement_kwarg_list'])
+
+    hit_set_ids = project['hit_set_ids']
+    cost = get_cost(project['setup_kwargs'], len(hit_set_ids))
+    if not hit_set_ids:
+        if project['resume_review']:
+            logger.info('\nAll sets of run %s have been created, nothing to resume.\n' % project['journal'].run)
+        else:
+            logger.info('\nThere are no sets to post.\n')
+        return cost
+
+    # HIT info summary
+    logger.info('\nHIT Summary\n' +
+                '  Name      : %s\n' % project['title'] +
+                '  Host      : %s %s\n' % (account, host) +
+                ('  HSetId    : %s (%d sets)\n' % (hit_set_ids, cost['n_sets']) if cost['n_sets'] > 1 else '') +
+                '  N Workers : %d = %d (assignment) * %d (set)\n' % (
+                    cost['n_workers'], cost['n_assignments'], cost['n_sets']))
+    log_event(logger, 'summary', project=project['name'], account=account, host=host,
+              n_sets=cost['n_sets'], n_assignments=cost['n_assignments'], n_workers=cost['n_workers'])
+    return cost
+
+
+def post_project(mtc, project, logger, max_workers=8, rate=5., limiter=None):
+    """ Create the HITs of a prepared project.
+
+    Returns:
+        created(list): The created HIT of every set of the project, in set order.
+    """
+    journal = project['journal']
+    if journal.run is None:
+        journal.start_run(shard=project.get('shard'))
+
+    build_hit_kwargs = get_hit_kwargs_builder(
+        project['name'], project['description_kwargs'], project['setup_kwargs'],
+        project['requirement_kwarg_list'], with_hit_set=project['with_hit_set'])
+    created = post_hit_sets(mtc, journal, project['hit_set_ids'], build_hit_kwargs,
+                            max_workers=max_workers, rate=rate, limiter=limiter,
+                            on_created=lambda hit: log_event(logger, 'hit_created',
+                                                             project=project['name'], **hit))
+    logger.info(summarize_latencies(created))
+
+    created_by_set = {**project['previously_created'], **{hit['SetId']: hit for hit in created}}
+    return [created_by_set[x] for x in project['all_hit_set_ids'] if x in created_by_set]
+
+
+def get_monitor_command(project_name, account, host, HITGroupId):
+    return 'python monitor_hits.py --project %s --account %s --host %s --group %s' % (
+        project_name, account, host, HITGroupId)
+
+
+def log_created_review(logger, project, created, host):
+    """ Log where to preview and list the created HITs of a project. """
+    journal = project['journal']
+    HITIds = [hit['HITId'] for hit in created]
+    HITGroupId = created[-1]['HITGroupId']
+
+    # preview url
+    preview_url = get_preview_url(host)
+    if len(HITIds) <= MAX_LOGGED_HITIDS:
+        HITIds_review = 'Here are the HITIDs:\n' + '\n'.join(HITIds) + '\n'
+    else:
+        HITIds_review = 'The %d HITIDs are in %s\n' % (len(HITIds), journal.path)
+    logger.info('\nNew HITs have been created. You can preview them here:\n' +
+                '%s?groupId=%s\n\n' % (preview_url, HITGroupId) + HITIds_review)
+
+    # monitor command
+    logger.info('\nCommand for monitoring the created HITs:\n\n' +
+                get_monitor_command(project['name'], journal.account, host, HITGroupId) +
+                '\n\n=======================================\n')
+    log_event(logger, 'created', project=project['name'], HITGroupId=HITGroupId, n_hits=len(HITIds))
+
+
+def postHITs(project_name, account, host, save_log=False, max_workers=8, rate=5.,
+             resume=False, use_cache=True, cache_ttl=3600):
     """ The main function for posting hits to mturk
     Args:
         project_name(str): The name of the HIT to post.
         account(str): The requester account to use.
         host(str): The platform to send HITs.
         save_log(bool): Save a lot file or not.
+        max_workers(int): The number of concurrent create_hit calls.
+        rate(float): The maximum number of create_hit calls per second.
+        resume(bool): Only post the sets that the last run did not create.
+        use_cache(bool): Reuse qualification names and worker counts from earlier runs.
+        cache_ttl(float): Seconds before a cached qualification is looked up again.
 
     Returns:
         HITIds(list): A list of HITIDs of created HITS.
     """
 
     # make sure that project directory and files exist
-    project_path = os.path.join(
-        WORK_PATH, 'experiments', EXPERIMENTER, project_name)
+    project_path = get_project_path(project_name)
     check_file_exists(project_path, LANDING_FILE)
     check_file_exists(project_path, CONFIG_FILE)
+    project_log_path = get_project_log_path(project_path)
 
     if save_log:
-        project_log_path = os.path.join(project_path, '.log')
-        if not os.path.exists(project_log_path):
-            os.mkdir(project_log_path)
         save_log_path = os.path.join(
             project_log_path, 'HITs_%s-%s.log' % (account, host))
         logger = set_logging_configs(__name__, save_log_path=save_log_path)
         logger.info(
-            "\npost_hits(%s, %s, host='%s', save_log=%s)\n" % (project_name, account, host, save_log))
+            "\npost_hits(%s, %s, host='%s', save_log=%s, resume=%s)\n" % (project_name, account, host, save_log, resume))
     else:
         logger = set_logging_configs(__name__)
 
-    try:
-        # read configuration settings
-        config = read_config(project_path, CONFIG_FILE)
+    API_METRICS.reset()
 
-        # whether running a test
-        if host == 'sandbox':
-            test_mode = 1  # testing in https://workersandbox.mturk.com/
-        elif config.has_section('TEST'):
-            test_mode = 2  # testing in https://worker.mturk.com/
-        else:
-            test_mode = 0
+    # Step 1: start the network fetches that do not depend on the config
+    with Preflight() as preflight:
+        mtc_future = preflight.submit('make_mtc', make_mtc, account, host)
+        if host == 'formal':
+            def get_account_balance():
+                return get_available_balance(mtc_future.result())
+            balance_future = preflight.submit('get_account_balance', get_account_balance)
+
+        try:
+            cache = QualificationCache(account, host, ttl=cache_ttl) if use_cache else None
+            project = prepare_project(project_name, account, host, preflight, mtc_future,
+                                      resume=resume, cache=cache)
+        except Exception:
+            logger.exception("\n!!! SOME ERRORS HAVE OCCURRED !!!\n\n")
+            log_event(logger, 'error', project=project_name)
+            return
 
-        # description settings
-        logger.info(get_review('description', config['INFO']))
-        description_kwargs = get_hit_descriptions(config['INFO'])
+        cost = log_project_review(logger, project, account, host)
 
-        # setups settings
-        if test_mode:
-            config['SETUP'] = TEST_SETUPS
-        logger.info(get_review('setup', config['SETUP']))
-        setup_kwargs = get_hit_setups(config['SETUP'])
+        if not project['hit_set_ids']:
+            previously_created = project['previously_created']
+            return [previously_created[x]['HITId'] for x in project['all_hit_set_ids'] if x in previously_created]
 
-        if config.has_section('HITSET'):
-            hit_set_ids = get_hit_set_ids(config['HITSET'])
-            def hit_set_url_builder(x): return '?HSetId=' + str(x)
-        else:
-            hit_set_ids = list(range(0, 1))
-            def hit_set_url_builder(x): return ''
+        # check point: log the account balance and expenses if it is a formal testing
+        if host == 'formal':
+            account_balance = balance_future.result()
+
+            logger.info('\n%(n_workers)d participants @ $%(unit_cost).2f ($%(reward).2f HIT + '
+                        '$%(service_fee).2f service fee) = $%(total_cost).2f\n' % dict(
+                            cost, unit_cost=cost['reward'] + cost['service_fee']) +
+                        get_balance_review(account, host, account_balance, cost['total_cost']))
+            log_event(logger, 'balance', account_balance=account_balance, total_cost=cost['total_cost'])
+
+        mtc = mtc_future.result()
+        logger.info(preflight.get_timings_review())
+    flush_logging(__name__)
+
+    # action required: check the above information and decide whether to proceed or not
+    notice = '\nDo you want to proceed to publish %s for %s %s? [y/n]: ' % (project_name, account.upper(), host.upper())
+    if not is_confirmed(notice):
+        logger.info('\nThe task is cancelled, quiting now ...\n' +
+                    '\n----------------------------------\n')
+        log_event(logger, 'cancelled', project=project_name)
+        return
+
+    # Step 2: create new HITs
+    created = post_project(mtc, project, logger, max_workers=max_workers, rate=rate)
+    log_created_review(logger, project, created, host)
+    HITIds = [hit['HITId'] for hit in created]
+
+    # where the time of the run went
+    logger.info(API_METRICS.get_review())
+    if save_log:
+        API_METRICS.save(os.path.splitext(save_log_path)[0] + '.metrics.json',
+                         project=project_name, account=account, host=host,
+                         time=time.strftime('%Y-%m-%d %H:%M:%S'), n_hits=len(HITIds))
 
-        # qualification requirement settings
-        if not test_mode:
-            requirement_review = "\nSpecify any additional qualifications Workers must meet ...\n"
-        else:
-            environments = {1: 'SANDBOX', 2: 'FORMAL'}
-            requirement_review = ('\nYou are testing in a %s environment.\n' % environments.get(test_mode) +
-                                  'Qualification requirements are skipped')
-            requirement_review += ' except for the testing qualification.\n\n' if test_mode == 2 else '.\n'
+    return HITIds
 
-        requirement_kwarg_list = []
-        # percent assignments approved
-        if config.has_section('PERCENT APPROVED') and not test_mode:
-            args = ('percent_assignments_approved', config['PERCENT APPROVED'])
-            requirement_review += get_review(*args)
-            requirement_kwarg_list.append(
-                get_qualification_requirements(*args)
-            )
-            del args
-
-        # num hit approved
-        if config.has_section('NUM APPROVED') and not test_mode:
-            args = ('num_hit_approved', config['NUM APPROVED'])
-            requirement_review += get_review(*args)
-            requirement_kwarg_list.append(
-                get_qualification_requirements(*args)
-            )
-            del args
-
-        # location (Country)
-        if config.has_section('LOCATION') and not test_mode:
-            args = ('location', config['LOCATION'])
-            requirement_review += get_review(*args)
-            requirement_kwarg_list.append(
-                get_qualification_requirements(*args)
-            )
-            del args
-
-    except Exception:
-        logger.exception("\n!!! SOME ERRORS HAVE OCCURRED !!!\n\n")
+
+def find_projects(patterns):
+    """ The project names matching names or glob patterns under the experimenter directory. """
+    experimenter_path = get_project_path('')
+    project_names = []
+    for pattern in patterns:
+        for project_path in sorted(glob.glob(os.path.join(experimenter_path, pattern))):
+            project_name = os.path.basename(project_path)
+            if os.path.exists(os.path.join(project_path, CONFIG_FILE)) and project_name not in project_names:
+                project_names.append(project_name)
+    return project_names
+
+
+def postBatchHITs(project_names, account, host, save_log=False, max_workers=8, rate=5.,
+                  resume=False, use_cache=True, cache_ttl=3600):
+    """ Post many projects in one process with one confirmation.
+
+    Every config is checked in parallel before anything is posted, the client
+    is shared, and all projects go through one rate limiter.
+
+    Args:
+        project_names(list): The names of the projects to post.
+        Other arguments are the ones of postHITs.
+
+    Returns:
+        HITIds(dict): The HITIds of each posted project.
+    """
+    if save_log:
+        batch_log_path = get_project_log_path(get_project_path(''))
+        save_log_path = os.path.join(batch_log_path, 'HITs_batch_%s-%s.log' % (account, host))
+        logger = set_logging_configs(__name__, save_log_path=save_log_path)
+        logger.info("\npost_hits batch(%s, %s, host='%s', resume=%s)\n" % (
+            ', '.join(project_names), account, host, resume))
     else:
-        # Step 1: create a mturk client
-        mtc = make_mtc(account, host)
-
-        # exclude the participants who have completed a previous task
-        if config.has_section('EXCLUDE QUALIFICATION TYPE') and not test_mode:
-            args = ('exclude_qualification_type',
-                    config['EXCLUDE QUALIFICATION TYPE'])
-            requirement_review += get_review(*args, mtc=mtc)
-            requirement_kwarg_list.append(
-                get_qualification_requirements(*args)
-            )
-
-        # only include the participants who have a specific qualification type
-        if config.has_section('INCLUDE QUALIFICATION TYPE') and not test_mode:
-            args = ('include_qualification_type',
-                    config['INCLUDE QUALIFICATION TYPE'])
-            requirement_review += get_review(*args, mtc=mtc)
-            requirement_kwarg_list.append(
-                get_qualification_requirements(*args)
-            )
-
-        if test_mode == 2:
-            args = ('include_qualification_type', config['TEST'])
-            requirement_review += get_review(*args, mtc=mtc)
-            requirement_kwarg_list = [
-                get_qualification_requirements(*args)
-            ]
-        logger.info(requirement_review)
-
-        # HIT info summary
-        n_assignments = setup_kwargs['MaxAssignments']
-        n_sets = len(hit_set_ids)
-        n_workers = n_assignments * n_sets
-
-        logger.info('\nHIT Summary\n' +
-                    '  Name      : %s\n' % config["INFO"]["title"] +
-                    '  Host      : %s %s\n' % (account, host) +
-                    ('  HSetId    : %s \n' % ", ".join(map(str, hit_set_ids)) if n_sets > 1 else '') +
-                    '  N Workers : %d = %d (assignment) * %d (set)\n' % (n_workers, n_assignments, n_sets))
+        logger = set_logging_configs(__name__)
 
-        # check point: log the account balance and expenses if it is a formal testing
+    API_METRICS.reset()
+
+    # Step 1: one client and one balance lookup for every project
+    with Preflight(max_workers=max(8, 2 * len(project_names))) as preflight:
+        mtc_future = preflight.submit('make_mtc', make_mtc, account, host)
         if host == 'formal':
-            account_balance = float(mtc.get_account_balance()[
-                'AvailableBalance'])
-
-            reward = float(setup_kwargs['Reward'])
-            service_fee = reward * (0.2 if n_assignments < 10 else 0.4)
-            total_cost = n_workers * (reward + service_fee)
-
-            logger.info('\n%d participants @ $%.2f ($%.2f HIT + $%.2f service fee) = $%.2f\n' % (n_workers, reward + service_fee, reward, service_fee, total_cost) +
-                        '\nAccount balance of %s %s\n' % (account, host) +
-                        '  Before HIT : $%.2f\n' % account_balance +
-                        '  After HIT  : $%.2f\n' % (account_balance - total_cost))
-
-        # action required: check the above information and decide whether to proceed or not
-        notice = '\nDo you want to proceed to publish %s for %s %s? [y/n]: ' % (project_name, account.upper(), host.upper())
-        if not is_confirmed(notice):
-            logger.info('\nThe task is cancelled, quiting now ...\n' +
-                        '\n----------------------------------\n')
+            def get_account_balance():
+                return get_available_balance(mtc_future.result())
+            balance_future = preflight.submit('get_account_balance', get_account_balance)
+
+        # check every config at once and report all errors together
+        cache = QualificationCache(account, host, ttl=cache_ttl) if use_cache else None
+        project_futures = [(name, preflight.submit('prepare %s' % name, prepare_project, name, account,
+                                                   host, preflight, mtc_future, resume=resume, cache=cache))
+                           for name in project_names]
+        projects, errors = [], []
+        for name, future in project_futures:
+            try:
+                projects.append(future.result())
+            except Exception as err:
+                errors.append((name, err))
+
+        if errors:
+            logger.error("\n!!! SOME ERRORS HAVE OCCURRED !!!\n\n" +
+                         ''.join('  %s : %r\n' % (name, err) for name, err in errors))
+            log_event(logger, 'error', projects=[name for name, _ in errors])
             return
 
-        # Step 2: create new HITs
-        HITIds = []
-        for set_id in hit_set_ids:
-            hit_url = get_hit_url(project_name, EXPERIMENTER,
-                                  LANDING_FILE) + hit_set_url_builder(set_id)
+        costs = {}
+        for project in projects:
+            logger.info('\n########## %s ##########\n' % project['name'])
+            costs[project['name']] = log_project_review(logger, project, account, host)
+        projects = [project for project in projects if project['hit_set_ids']]
+
+        # the combined cost of the batch
+        total_cost = sum(costs[project['name']]['total_cost'] for project in projects)
+        batch_review = '\nBatch Summary\n'
+        for project in projects:
+            cost = costs[project['name']]
+            batch_review += '  %-30s : %6d sets %7d workers  $%.2f\n' % (
+                project['name'], cost['n_sets'], cost['n_workers'], cost['total_cost'])
+        batch_review += '  %-30s : $%.2f\n' % ('Total', total_cost)
+        if host == 'formal':
+            batch_review += get_balance_review(account, host, balance_future.result(), total_cost)
+        logger.info(batch_review)
+
+        mtc = mtc_future.result()
+        logger.info(preflight.get_timings_review())
+    flush_logging(__name__)
+
+    if not projects:
+        logger.info('\nThere is nothing to post.\n')
+        return {}
+
+    # action required: one confirmation for the whole batch
+    notice = '\nDo you want to proceed to publish %d projects for %s %s? [y/n]: ' % (
+        len(projects), account.upper(), host.upper())
+    if not is_confirmed(notice):
+        logger.info('\nThe batch is cancelled, quiting now ...\n' +
+                    '\n----------------------------------\n')
+        log_event(logger, 'cancelled', projects=[project['name'] for project in projects])
+        return
+
+    # Step 2: post every project through one rate limiter
+    limiter = RateLimiter(rate)
+    HITIds = {}
+    for project in projects:
+        created = post_project(mtc, project, logger, max_workers=max_workers, limiter=limiter)
+        log_created_review(logger, project, created, host)
+        HITIds[project['name']] = [hit['HITId'] for hit in created]
+
+    logger.info(API_METRICS.get_review())
+    if save_log:
+        API_METRICS.save(os.path.splitext(save_log_path)[0] + '.metrics.json',
+                         projects=list(HITIds), account=account, host=host,
+                         time=time.strftime('%Y-%m-%d %H:%M:%S'),
+                         n_hits=sum(len(ids) for ids in HITIds.values()))
+    return HITIds
+
+
+def split_hit_set_ids(hit_set_ids, balances, set_cost):
+    """ Split the sets across accounts in proportion to their balances.
+
+    No account gets more sets than its balance can pay for; the sets are
+    handed out in consecutive shards, in the order of balances.
 
-            question = ExternalQuestion(external_url=hit_url).get_as_xml()
-            new_hit = mtc.create_hit(Question=question,
-                                     **description_kwargs, **setup_kwargs,
-                                     QualificationRequirements=requirement_kwarg_list)
+    Args:
+        hit_set_ids(HSetIdRange): The sets to split.
+        balances(dict): The available balance of each account.
+        set_cost(float): The cost of one set, see get_cost.
+
+    Returns:
+        shards(dict): The HSetIdRange of each account.
+    """
+    n_sets = len(hit_set_ids)
+    accounts = list(balances)
+    affordable = {a: int(balances[a] // set_cost) if set_cost else n_sets for a in accounts}
+    if sum(affordable.values()) < n_sets:
+        raise RuntimeError('The accounts can pay for %d of the %d sets.' % (
+            sum(affordable.values()), n_sets))
+
+    # largest remainder shares of the balances, capped by what each account can pay
+    sizes = dict.fromkeys(accounts, 0)
+    todo = n_sets
+    while todo:
+        open_accounts = [a for a in accounts if sizes[a] < affordable[a]]
+        total_balance = sum(balances[a] for a in open_accounts) or len(open_accounts)
+        shares = {a: todo * (balances[a] or 1) / total_balance for a in open_accounts}
+        given = {a: min(int(shares[a]), affordable[a] - sizes[a]) for a in open_accounts}
+        left = todo - sum(given.values())
+        for a in sorted(open_accounts, key=lambda a: shares[a] - int(shares[a]), reverse=True):
+            if left and sizes[a] + given[a] < affordable[a]:
+                given[a] += 1
+                left -= 1
+        for a in open_accounts:
+            sizes[a] += given[a]
+        todo = left
+
+    return dict(zip(accounts, hit_set_ids.split([sizes[a] for a in accounts])))
+
+
+def postShardedHITs(project_name, accounts, host, save_log=False, max_workers=8, rate=5.,
+                    use_cache=True, cache_ttl=3600):
+    """ Post the sets of a project across several requester accounts.
+
+    The balances are fetched at once and the sets are split in proportion to
+    them. Every account posts its shard in parallel, through its own client,
+    journal and rate limit.
+
+    Args:
+        accounts(list): The requester accounts to share the sets; the first one
+            owns the qualification types of the config.
+        Other arguments are the ones of postHITs.
 
-            HITId = new_hit["HIT"]["HITId"]
-            HITGroupId = new_hit["HIT"]["HITGroupId"]
-            HITIds.append(HITId)
+    Returns:
+        HITIds(dict): The HITIds of each account.
+    """
+    project_path = get_project_path(project_name)
+    check_file_exists(project_path, LANDING_FILE)
+    check_file_exists(project_path, CONFIG_FILE)
+    project_log_path = get_project_log_path(project_path)
 
-        # preview url
-        preview_url = get_preview_url(host)
-        logger.info('\nNew HITs have been created. You can preview them here:\n' +
-                    '%s?groupId=%s\n\n' % (preview_url, HITGroupId) +
-                    'Here are the HITIDs:\n' + '\n'.join(HITIds) + '\n')
+    if save_log:
+        save_log_path = os.path.join(project_log_path, 'HITs_sharded-%s.log' % host)
+        logger = set_logging_configs(__name__, save_log_path=save_log_path)
+        logger.info("\npost_hits sharded(%s, %s, host='%s')\n" % (project_name, ', '.join(accounts), host))
+    else:
+        logger = set_logging_configs(__name__)
 
-        # aws shell command
-        list_hits_command = get_aws_shell_list_hits(
-            HITGroupId, host, max_results=len(HITIds))
-        logger.info('\nAWS CLI command for listing created HITs:\n\n' +
-                    list_hits_command +
-                    '\n\n=======================================\n')
+    API_METRICS.reset()
+
+    # Step 1: a client and a balance of every account, at once
+    with Preflight(max_workers=max(8, 4 * len(accounts))) as preflight:
+        mtc_futures, balance_futures = {}, {}
+        for account in accounts:
+            mtc_futures[account] = preflight.submit('make_mtc %s' % account, make_mtc, account, host)
+            balance_futures[account] = preflight.submit(
+                'get_account_balance %s' % account,
+                lambda mtc_future: get_available_balance(mtc_future.result()),
+                mtc_futures[account])
+
+        # a qualification type can only be looked up by the account that owns it, the first one
+        owner = accounts[0]
+        project_future = preflight.submit('prepare %s' % owner, prepare_project, project_name,
+                                          owner, host, preflight, mtc_futures[owner],
+                                          cache=QualificationCache(owner, host, ttl=cache_ttl)
+                                          if use_cache else None)
+        try:
+            project = project_future.result()
+            balances = {account: future.result() for account, future in balance_futures.items()}
+            for future in project['review_futures']:
+                future.result()
+
+            # every account posts the same HITs, through a journal of its own
+            projects = {account: dict(project, journal=CreationJournal(
+                            get_journal_path(project_path, account, host), project_name, account, host))
+                        for account in accounts}
+
+            setup_kwargs = project['setup_kwargs']
+            hit_set_ids = project['hit_set_ids']
+            set_cost = get_cost(setup_kwargs, 1)['total_cost']
+            shards = split_hit_set_ids(hit_set_ids, balances, set_cost)
+        except Exception:
+            logger.exception("\n!!! SOME ERRORS HAVE OCCURRED !!!\n\n")
+            log_event(logger, 'error', project=project_name)
+            return
 
-        return HITIds
+        costs = {}
+        for account, project in projects.items():
+            project['hit_set_ids'] = project['all_hit_set_ids'] = shards[account]
+            project['shard'] = str(shards[account])
+            logger.info('\n########## %s ##########\n' % account)
+            costs[account] = log_project_review(logger, project, account, host)
+
+        # the combined cost of the shards
+        total_cost = sum(cost['total_cost'] for cost in costs.values())
+        shard_review = '\nShard Summary (%d sets @ $%.2f)\n' % (len(hit_set_ids), set_cost)
+        for account in accounts:
+            cost = costs[account]
+            shard_review += '  %-12s : %6d sets  $%9.2f  balance $%9.2f -> $%9.2f\n' % (
+                account, cost['n_sets'], cost['total_cost'], balances[account],
+                balances[account] - cost['total_cost'])
+        shard_review += '  %-12s : %6d sets  $%9.2f\n' % ('Total', len(hit_set_ids), total_cost)
+        logger.info(shard_review)
+        log_event(logger, 'shards', project=project_name, balances=balances,
+                  shards={account: str(shard) for account, shard in shards.items()})
+
+        mtcs = {account: future.result() for account, future in mtc_futures.items()}
+        logger.info(preflight.get_timings_review())
+    flush_logging(__name__)
+
+    # action required: one confirmation for every account
+    notice = '\nDo you want to proceed to publish %s for %s %s? [y/n]: ' % (
+        project_name, ' + '.join(account.upper() for account in accounts), host.upper())
+    if not is_confirmed(notice):
+        logger.info('\nThe task is cancelled, quiting now ...\n' +
+                    '\n----------------------------------\n')
+        log_event(logger, 'cancelled', project=project_name)
+        return
+
+    # Step 2: post every shard in parallel, each account at its own rate
+    posted = [account for account in accounts if projects[account]['hit_set_ids']]
+    with ThreadPoolExecutor(max_workers=len(posted) or 1) as executor:
+        created_futures = {account: executor.submit(post_project, mtcs[account], projects[account],
+                                                    logger, max_workers=max_workers, rate=rate)
+                           for account in posted}
+        created = {account: future.result() for account, future in created_futures.items()}
+
+    # one report of every shard
+    preview_url = get_preview_url(host)
+    review = '\nNew HITs have been created. You can preview them here:\n'
+    for account in posted:
+        review += '  %-12s : %s?groupId=%s\n' % (account, preview_url, created[account][-1]['HITGroupId'])
+        log_event(logger, 'created', project=project_name, account=account,
+                  HITGroupId=created[account][-1]['HITGroupId'], n_hits=len(created[account]))
+
+    n_hits = sum(len(hits) for hits in created.values())
+    if n_hits <= MAX_LOGGED_HITIDS:
+        review += '\nHere are the HITIDs:\n' + ''.join(
+            '%s %s\n' % (hit['HITId'], account) for account in posted for hit in created[account])
+    else:
+        review += '\nThe %d HITIDs are in\n' % n_hits + ''.join(
+            '  %s\n' % projects[account]['journal'].path for account in posted)
+    review += '\nCommands for monitoring the created HITs:\n\n' + ''.join(
+        get_monitor_command(project_name, account, host, created[account][-1]['HITGroupId']) + '\n'
+        for account in posted)
+    logger.info(review + '\n=======================================\n')
+
+    logger.info(API_METRICS.get_review())
+    if save_log:
+        API_METRICS.save(os.path.splitext(save_log_path)[0] + '.metrics.json',
+                         project=project_name, accounts=accounts, host=host,
+                         time=time.strftime('%Y-%m-%d %H:%M:%S'), n_hits=n_hits)
+    return {account: [hit['HITId'] for hit in created[account]] for account in posted}
 
 
 if __name__ == '__main__':
@@ -220,12 +734,27 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--project', type=str,
                         help='Which project to post?')
+    parser.add_argument('--batch', type=str, nargs='*',
+                        help='Which projects (names or glob patterns) to post together?')
     parser.add_argument('--account', type=str,
                         help='Which requester account to use?')
+    parser.add_argument('--shard', type=str, nargs='*',
+                        help='Which requester accounts to split the sets across (the first owns the qualification '
+                             'types), all if none given?')
     parser.add_argument('--host', type=str, default='sandbox',
                         help='Which platform to host, sandbox or formal?')
     parser.add_argument('--save_log', type=int, default=0,
                         help='Save a log file or not?')
+    parser.add_argument('--workers', type=get_worker_count, default=8,
+                        help='How many HITs to create concurrently?')
+    parser.add_argument('--rate', type=float, default=5.,
+                        help='How many create_hit calls per second at most?')
+    parser.add_argument('--no_cache', action='store_true',
+                        help='Look up qualification types again instead of using the cache?')
+    parser.add_argument('--cache_ttl', type=float, default=60,
+                        help='How many minutes to keep qualification lookups in the cache?')
+    parser.add_argument('--resume', action='store_true',
+                        help='Only post the sets that the last run did not create?')
 
     # parse terminal inputs
     args = parser.parse_args()
@@ -234,4 +763,18 @@ if __name__ == '__main__':
     save_log = True if args.host == 'formal' else args.save_log
 
     # post HIT to mturk
-    postHITs(args.project, args.account, args.host, save_log=save_log)
+    post_kwargs = dict(save_log=save_log, max_workers=args.workers, rate=args.rate,
+                       resume=args.resume, use_cache=not args.no_cache,
+                       cache_ttl=args.cache_ttl * 60)
+    if args.shard is not None:
+        if args.resume:
+            parser.error('--resume does not work with --shard')
+        del post_kwargs['resume']
+        postShardedHITs(args.project, args.shard or list(REQUESTER_ACCOUNTS), args.host, **post_kwargs)
+    elif args.batch:
+        project_names = find_projects(args.batch)
+        if not project_names:
+            parser.error('no project matches %s' % ' '.join(args.batch))
+        postBatchHITs(project_names, args.account, args.host, **post_kwargs)
+    else:
+        postHITs(args.project, args.account, args.host, **post_kwargs)
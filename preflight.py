@@ -0,0 +1,56 @@
+"""
+    concurrent, timed preflight steps
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Preflight:
+    """ Start independent preflight steps at once and time every one of them.
+
+    Steps submitted with submit run in a thread pool, steps passed to run are
+    timed in the calling thread. Use it as a context manager so that steps
+    left over after an error are cancelled.
+    """
+
+    def __init__(self, max_workers=8):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._started_at = time.perf_counter()
+        self._lock = threading.Lock()
+        self.timings = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, name, func, *args, **kwargs):
+        return self._executor.submit(self.run, name, func, *args, **kwargs)
+
+    def run(self, name, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.timings.append((name, start - self._started_at, end - start))
+
+    def get_timings_review(self):
+        wall_time = time.perf_counter() - self._started_at
+        with self._lock:
+            timings = sorted(self.timings, key=lambda timing: timing[1])
+
+        width = max([len(name) for name, _, _ in timings] + [9])
+        review = '\nPreflight timing\n'
+        for name, started, duration in timings:
+            review += '  %s : %6.3f s  (from +%.3f s)\n' % (name.ljust(width), duration, started)
+        review += '  %s : %6.3f s  (steps add up to %.3f s)\n' % (
+            'wall time'.ljust(width), wall_time, sum(duration for _, _, duration in timings))
+        return review
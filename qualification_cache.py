@@ -0,0 +1,94 @@
+"""
+    on-disk cache of qualification type metadata
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+
+
+QUALIFICATION_CACHE_PATH = os.path.join(
+    os.path.expanduser('~'), '.cache', 'post_hits', 'qualifications.json')
+
+# the caches of every account share one file, e.g. in a sharded posting
+_CACHE_LOCK = threading.Lock()
+
+
+class QualificationCache:
+    """ The names and worker counts of qualification types, shared between runs.
+
+    Entries are keyed by (host, account, qualification id), expire after ttl
+    seconds, and the least recently used ones are evicted beyond max_entries.
+
+    Args:
+        account(str): The requester account.
+        host(str): The platform, sandbox or formal.
+        path(str): The cache file.
+        ttl(float): Seconds before an entry has to be fetched again.
+        max_entries(int): The number of entries kept in the file.
+    """
+
+    def __init__(self, account, host, path=QUALIFICATION_CACHE_PATH, ttl=3600, max_entries=256):
+        self.account = account
+        self.host = host
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = _CACHE_LOCK
+
+    def key(self, qt_id):
+        return '%s|%s|%s' % (self.host, self.account, qt_id)
+
+    def get(self, qt_id):
+        """ The cached entry of a qualification type, or None if it is missing or expired. """
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(self.key(qt_id))
+            if entry is None or time.time() - entry['cached_at'] > self.ttl:
+                return None
+
+            entry['used_at'] = time.time()
+            self._save(entries)
+            return entry
+
+    def set(self, qt_id, name, num_workers):
+        with self._lock:
+            entries = self._load()
+            now = time.time()
+            entries[self.key(qt_id)] = dict(Name=name, NumWorkers=num_workers,
+                                            cached_at=now, used_at=now)
+            self._save(entries)
+
+    def invalidate(self, qt_id):
+        with self._lock:
+            entries = self._load()
+            if entries.pop(self.key(qt_id), None) is not None:
+                self._save(entries)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, entries):
+        # drop expired entries, then the least recently used ones
+        now = time.time()
+        entries = {k: v for k, v in entries.items() if now - v['cached_at'] <= self.ttl}
+        if len(entries) > self.max_entries:
+            keep = sorted(entries, key=lambda k: entries[k]['used_at'])[-self.max_entries:]
+            entries = {k: entries[k] for k in keep}
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # a temp file of its own, so that no other writer can replace it first
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,243 @@
+"""
+    local SQLite store of HITs and assignments, synced incrementally
+"""
+
+import os
+import json
+import time
+import sqlite3
+
+from helpers import set_logging_configs, make_mtc, get_worker_count, iter_assignments_for_hit
+from engine import ThrottledClient, run_concurrently
+from get_assignments import format_assignment
+from journal import CreationJournal, get_journal_path
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hits (
+    HITId TEXT PRIMARY KEY,
+    HITGroupId TEXT,
+    SetId TEXT,
+    HITStatus TEXT,
+    NumberOfAssignmentsPending INTEGER,
+    NumberOfAssignmentsAvailable INTEGER,
+    NumberOfAssignmentsCompleted INTEGER,
+    synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS assignments (
+    AssignmentId TEXT PRIMARY KEY,
+    HITId TEXT NOT NULL,
+    WorkerId TEXT,
+    AssignmentStatus TEXT,
+    AcceptTime TEXT,
+    SubmitTime TEXT,
+    ApprovalTime TEXT,
+    RejectionTime TEXT,
+    Answer TEXT,
+    synced_at REAL
+);
+CREATE INDEX IF NOT EXISTS hits_group ON hits (HITGroupId);
+CREATE INDEX IF NOT EXISTS assignments_hit ON assignments (HITId);
+CREATE INDEX IF NOT EXISTS assignments_worker ON assignments (WorkerId);
+CREATE INDEX IF NOT EXISTS assignments_status ON assignments (AssignmentStatus);
+"""
+
+# the fields of get_hit that change whenever an assignment of the HIT changes
+HIT_SIGNATURE = ('HITStatus', 'NumberOfAssignmentsPending',
+                 'NumberOfAssignmentsAvailable', 'NumberOfAssignmentsCompleted')
+
+ASSIGNMENT_FIELDS = ('AssignmentId', 'HITId', 'WorkerId', 'AssignmentStatus', 'AcceptTime',
+                     'SubmitTime', 'ApprovalTime', 'RejectionTime', 'Answer')
+
+
+def get_store_path(project_path, account, host):
+    return os.path.join(project_path, '.log', 'results_%s-%s.sqlite3' % (account, host))
+
+
+class ResultsStore:
+    """ HITs and assignments of a project, kept in a local SQLite file.
+
+    Args:
+        path(str): The SQLite file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def add_hits(self, hits):
+        """ Register HITs to sync, e.g. the created HIT records of a journal. """
+        with self.db:
+            self.db.executemany(
+                'INSERT INTO hits (HITId, HITGroupId, SetId) VALUES (?, ?, ?) '
+                'ON CONFLICT (HITId) DO NOTHING',
+                [(hit['HITId'], hit.get('HITGroupId'), _to_text(hit.get('SetId'))) for hit in hits])
+
+    def get_hit_ids(self, HITGroupId=None):
+        if HITGroupId is None:
+            rows = self.db.execute('SELECT HITId FROM hits')
+        else:
+            rows = self.db.execute('SELECT HITId FROM hits WHERE HITGroupId = ?', (HITGroupId,))
+        return [row['HITId'] for row in rows]
+
+    def sync(self, mtc, HITIds=None, full=False, max_workers=8, rate=5.):
+        """ Fetch the assignments that are new or changed since the last sync.
+
+        get_hit is called for every HIT; assignments are only listed for the
+        HITs whose status or assignment counts differ from the stored ones,
+        and only rows whose status changed are written.
+
+        Returns:
+            counts(dict): The number of HITs checked, listed and failed, of
+                assignments inserted, updated or unchanged, and the error of
+                every failed HIT, e.g. a deleted one.
+        """
+        mtc = ThrottledClient(mtc, rate=rate)
+        HITIds = self.get_hit_ids() if HITIds is None else list(HITIds)
+        stored = {row['HITId']: tuple(row[k] for k in HIT_SIGNATURE)
+                  for row in self.db.execute('SELECT * FROM hits')}
+
+        def fetch(HITId):
+            hit = mtc.get_hit(HITId=HITId)['HIT']
+            signature = tuple(hit[k] for k in HIT_SIGNATURE)
+            if not full and stored.get(HITId) == signature:
+                return hit, None
+            return hit, [format_assignment(a) for a in iter_assignments_for_hit(mtc, HITId)]
+
+        counts = dict(checked=0, listed=0, failed=0, inserted=0, updated=0, unchanged=0, errors={})
+        for HITId, result in run_concurrently(fetch, HITIds, max_workers=max_workers,
+                                              return_exceptions=True):
+            if isinstance(result, Exception):
+                # one HIT that cannot be fetched must not stop the others
+                counts['failed'] += 1
+                counts['errors'][HITId] = str(result)
+                continue
+            hit, assignments = result
+            counts['checked'] += 1
+            if assignments is None:
+                continue
+
+            counts['listed'] += 1
+            with self.db:
+                for assignment in assignments:
+                    counts[self._upsert_assignment(assignment)] += 1
+                self.db.execute(
+                    'INSERT INTO hits (HITId, HITGroupId, %s, synced_at) VALUES (?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (HITId) DO UPDATE SET HITGroupId = excluded.HITGroupId, %s, '
+                    'synced_at = excluded.synced_at' % (
+                        ', '.join(HIT_SIGNATURE),
+                        ', '.join('%s = excluded.%s' % (k, k) for k in HIT_SIGNATURE)),
+                    (HITId, hit['HITGroupId']) + tuple(hit[k] for k in HIT_SIGNATURE) + (time.time(),))
+        return counts
+
+    def _upsert_assignment(self, assignment):
+        row = self.db.execute('SELECT AssignmentStatus FROM assignments WHERE AssignmentId = ?',
+                              (assignment['AssignmentId'],)).fetchone()
+        if row is not None and row['AssignmentStatus'] == assignment['AssignmentStatus']:
+            return 'unchanged'
+
+        values = [_to_text(assignment.get(k)) for k in ASSIGNMENT_FIELDS] + [time.time()]
+        self.db.execute('INSERT OR REPLACE INTO assignments (%s, synced_at) VALUES (%s)' % (
+            ', '.join(ASSIGNMENT_FIELDS), ', '.join('?' * len(values))), values)
+        return 'inserted' if row is None else 'updated'
+
+    def get_worker_assignments(self, WorkerId):
+        return [dict(row) for row in self.db.execute(
+            'SELECT a.*, h.SetId, h.HITGroupId FROM assignments a JOIN hits h USING (HITId) '
+            'WHERE a.WorkerId = ? ORDER BY a.SubmitTime', (WorkerId,))]
+
+    def get_assignments(self, status=None, SetId=None, WorkerIds=None):
+        query = 'SELECT a.*, h.SetId, h.HITGroupId FROM assignments a JOIN hits h USING (HITId) WHERE 1'
+        params = []
+        if status:
+            query += ' AND a.AssignmentStatus = ?'
+            params.append(status)
+        if SetId is not None:
+            query += ' AND h.SetId = ?'
+            params.append(_to_text(SetId))
+        if WorkerIds is not None:
+            WorkerIds = list(WorkerIds)
+            query += ' AND a.WorkerId IN (%s)' % ', '.join('?' * len(WorkerIds))
+            params += WorkerIds
+        return [dict(row) for row in self.db.execute(query, params)]
+
+    def get_set_summary(self):
+        """ The number of assignments per set and status. """
+        return [dict(row) for row in self.db.execute(
+            'SELECT h.SetId, a.AssignmentStatus, COUNT(*) AS n FROM assignments a '
+            'JOIN hits h USING (HITId) GROUP BY h.SetId, a.AssignmentStatus '
+            'ORDER BY CAST(h.SetId AS INTEGER), a.AssignmentStatus')]
+
+
+def _to_text(value):
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return str(value)
+
+
+def open_project_store(project_name, account, host):
+    """ The results store of a project, with the HITs of its creation journal registered. """
+    from post_hits import get_project_path
+
+    project_path = get_project_path(project_name)
+    journal = CreationJournal(get_journal_path(project_path, account, host),
+                              project_name, account, host)
+    store = ResultsStore(get_store_path(project_path, account, host))
+    store.add_hits(journal.created_hits())
+    return store
+
+
+if __name__ == '__main__':
+    import argparse
+
+    # create parser object
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['sync', 'worker', 'sets'],
+                        help='Sync the store, or query a worker or every set?')
+    parser.add_argument('--project', type=str,
+                        help='Which project to use?')
+    parser.add_argument('--account', type=str,
+                        help='Which requester account to use?')
+    parser.add_argument('--host', type=str, default='sandbox',
+                        help='Which platform to host, sandbox or formal?')
+    parser.add_argument('--group', type=str,
+                        help='Only sync the HITs of this HIT group?')
+    parser.add_argument('--full', action='store_true',
+                        help='List the assignments of every HIT, changed or not?')
+    parser.add_argument('--worker', type=str,
+                        help='Which WorkerId to query?')
+    parser.add_argument('--workers', type=get_worker_count, default=8,
+                        help='How many HITs to sync concurrently?')
+
+    # parse terminal inputs
+    args = parser.parse_args()
+
+    logger = set_logging_configs(__name__)
+    store = open_project_store(args.project, args.account, args.host)
+
+    if args.command == 'sync':
+        mtc = make_mtc(args.account, args.host)
+        counts = store.sync(mtc, HITIds=store.get_hit_ids(args.group), full=args.full,
+                            max_workers=args.workers)
+        logger.info('\nChecked %(checked)d HITs, listed %(listed)d: %(inserted)d new and '
+                    '%(updated)d changed assignments.\n' % counts)
+        if counts['failed']:
+            logger.info('%d HITs could not be synced:\n' % counts['failed'] + ''.join(
+                '  %s : %s\n' % (HITId, error) for HITId, error in counts['errors'].items()))
+
+    elif args.command == 'worker':
+        for assignment in store.get_worker_assignments(args.worker):
+            print('%(SetId)s\t%(HITId)s\t%(AssignmentId)s\t%(AssignmentStatus)s\t%(SubmitTime)s' % assignment)
+
+    elif args.command == 'sets':
+        for row in store.get_set_summary():
+            print('%(SetId)s\t%(AssignmentStatus)s\t%(n)d' % row)
+
+    store.close()
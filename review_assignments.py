@@ -0,0 +1,214 @@
+"""
+    approve, reject or bonus assignments in bulk
+"""
+
+import os
+import json
+import hashlib
+import threading
+
+from helpers import set_logging_configs, make_mtc, get_worker_count
+from engine import ThrottledClient, run_concurrently
+
+
+ACTIONS = ('approve', 'reject', 'bonus')
+
+
+def read_targets(file_path):
+    """ Read 'AssignmentId[,WorkerId]' lines; a WorkerId is needed for bonuses. """
+    targets = []
+    with open(file_path) as f:
+        for line in f:
+            fields = [field.strip() for field in line.split(',')]
+            if not fields[0] or fields[0].startswith('#'):
+                continue
+            targets.append(dict(AssignmentId=fields[0],
+                                WorkerId=fields[1] if len(fields) > 1 else None))
+    return targets
+
+
+def get_progress_key(action, kwargs):
+    # a bonus of another amount is another bonus, so bonuses are tracked by their token
+    if action == 'bonus':
+        return kwargs['UniqueRequestToken']
+    return kwargs['AssignmentId']
+
+
+def read_progress(progress_path, action):
+    """ The progress keys (see get_progress_key) that the action has already succeeded on. """
+    done = set()
+    if not os.path.exists(progress_path):
+        return done
+    with open(progress_path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry['action'] == action and entry['ok']:
+                done.add(entry.get('UniqueRequestToken', entry['AssignmentId']))
+    return done
+
+
+def get_bonus_token(AssignmentId, amount):
+    # resending the same bonus is a no-op on MTurk's side
+    return hashlib.sha1(('bonus|%s|%s' % (AssignmentId, amount)).encode()).hexdigest()
+
+
+def get_review_kwargs(action, target, feedback=None, amount=None, reason=None):
+    AssignmentId = target['AssignmentId']
+    if action == 'approve':
+        kwargs = dict(AssignmentId=AssignmentId)
+        if feedback:
+            kwargs['RequesterFeedback'] = feedback
+        return 'approve_assignment', kwargs
+
+    elif action == 'reject':
+        if not feedback:
+            raise RuntimeError('A feedback is required to reject an assignment.')
+        return 'reject_assignment', dict(AssignmentId=AssignmentId, RequesterFeedback=feedback)
+
+    elif action == 'bonus':
+        if not target.get('WorkerId') or not amount or not reason:
+            raise RuntimeError('A WorkerId, an amount and a reason are required to send a bonus.')
+        return 'send_bonus', dict(WorkerId=target['WorkerId'], AssignmentId=AssignmentId,
+                                  BonusAmount='%.2f' % float(amount), Reason=reason,
+                                  UniqueRequestToken=get_bonus_token(AssignmentId, amount))
+    else:
+        raise RuntimeError('The action "%s" does not exist, please use %s.' % (action, ', '.join(ACTIONS)))
+
+
+def review_assignments(mtc, targets, action, progress_path, feedback=None, amount=None,
+                       reason=None, dry_run=False, max_workers=8, rate=5.):
+    """ Run one review action on many assignments.
+
+    Every outcome is appended to the progress file; assignments the action
+    already succeeded on are skipped, so an interrupted pass can be rerun.
+
+    Args:
+        mtc: A mturk client.
+        targets(list): Dicts with an AssignmentId and, for bonuses, a WorkerId.
+        action(str): approve, reject or bonus.
+        progress_path(str): The JSONL progress file.
+        feedback(str): The RequesterFeedback of approvals and rejections.
+        amount(float): The bonus in dollars.
+        reason(str): The reason given for a bonus.
+        dry_run(bool): Only report what would be done.
+        max_workers(int): The number of concurrent calls.
+        rate(float): The maximum number of calls per second.
+
+    Returns:
+        summary(dict): The counts of succeeded, failed and skipped assignments,
+            and the error of every failure.
+    """
+    # check the arguments before anything is sent
+    calls = [(target, get_review_kwargs(action, target, feedback, amount, reason)) for target in targets]
+
+    done = read_progress(progress_path, action)
+    calls = [call for call in calls if get_progress_key(action, call[1][1]) not in done]
+    summary = dict(total=len(targets), skipped=len(targets) - len(calls),
+                   succeeded=0, failed=0, failures={})
+    if dry_run:
+        summary['would_run'] = len(calls)
+        return summary
+
+    mtc = ThrottledClient(mtc, rate=rate)
+    lock = threading.Lock()
+
+    with open(progress_path, 'a') as f:
+        def review(call):
+            target, (operation, kwargs) = call
+            entry = dict(action=action, AssignmentId=target['AssignmentId'])
+            if 'UniqueRequestToken' in kwargs:
+                entry['UniqueRequestToken'] = kwargs['UniqueRequestToken']
+            try:
+                getattr(mtc, operation)(**kwargs)
+            except Exception as err:
+                entry.update(ok=False, error=str(err))
+            else:
+                entry.update(ok=True)
+            with lock:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+            return entry
+
+        for _, entry in run_concurrently(review, calls, max_workers=max_workers):
+            if entry['ok']:
+                summary['succeeded'] += 1
+            else:
+                summary['failed'] += 1
+                summary['failures'][entry['AssignmentId']] = entry['error']
+
+    return summary
+
+
+def get_summary_review(action, summary):
+    review = ('\n%s summary\n' % action.capitalize() +
+              '  Assignments : %d\n' % summary['total'] +
+              '  Skipped     : %d (done before)\n' % summary['skipped'])
+    if 'would_run' in summary:
+        return review + '  Dry run     : %d would be sent\n' % summary['would_run']
+
+    review += ('  Succeeded   : %d\n' % summary['succeeded'] +
+               '  Failed      : %d\n' % summary['failed'])
+    for AssignmentId, error in summary['failures'].items():
+        review += '    %s : %s\n' % (AssignmentId, error)
+    return review
+
+
+if __name__ == '__main__':
+    import argparse
+
+    # create parser object
+    parser = argparse.ArgumentParser()
+    parser.add_argument('action', choices=ACTIONS,
+                        help='Approve, reject or bonus the assignments?')
+    parser.add_argument('--account', type=str,
+                        help='Which requester account to use?')
+    parser.add_argument('--host', type=str, default='sandbox',
+                        help='Which platform to host, sandbox or formal?')
+    parser.add_argument('--ids', type=str,
+                        help='Which file of "AssignmentId[,WorkerId]" lines to review?')
+    parser.add_argument('--project', type=str,
+                        help='Which project results store to select assignments from?')
+    parser.add_argument('--status', type=str, default='Submitted',
+                        help='Only select assignments with this status from the results store?')
+    parser.add_argument('--set', type=str,
+                        help='Only select assignments of this HSetId from the results store?')
+    parser.add_argument('--worker', type=str, nargs='*',
+                        help='Only select assignments of these WorkerIds from the results store?')
+    parser.add_argument('--feedback', type=str,
+                        help='Which feedback to give with approvals and rejections?')
+    parser.add_argument('--amount', type=float,
+                        help='How many dollars to bonus?')
+    parser.add_argument('--reason', type=str,
+                        help='Which reason to give with bonuses?')
+    parser.add_argument('--progress', type=str, default='review_progress.jsonl',
+                        help='Which file to keep the progress in?')
+    parser.add_argument('--dry_run', action='store_true',
+                        help='Only report what would be done?')
+    parser.add_argument('--workers', type=get_worker_count, default=8,
+                        help='How many calls to run concurrently?')
+    parser.add_argument('--rate', type=float, default=5.,
+                        help='How many calls per second at most?')
+
+    # parse terminal inputs
+    args = parser.parse_args()
+
+    if args.ids:
+        targets = read_targets(args.ids)
+    elif args.project:
+        from results_store import open_project_store
+        store = open_project_store(args.project, args.account, args.host)
+        targets = store.get_assignments(status=args.status, SetId=args.set, WorkerIds=args.worker)
+        store.close()
+    else:
+        parser.error('either --ids or --project is required')
+
+    logger = set_logging_configs(__name__)
+    mtc = None if args.dry_run else make_mtc(args.account, args.host)
+    summary = review_assignments(mtc, targets, args.action,
+                                 args.progress, feedback=args.feedback, amount=args.amount,
+                                 reason=args.reason, dry_run=args.dry_run,
+                                 max_workers=args.workers, rate=args.rate)
+    logger.info(get_summary_review(args.action, summary))
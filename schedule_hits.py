@@ -0,0 +1,296 @@
+"""
+    post the sets of a project in waves, under a budget
+"""
+
+import os
+import time
+import tempfile
+
+from helpers import (set_logging_configs, log_event, flush_logging, make_mtc, is_confirmed,
+                     get_hit_descriptions, get_hit_setups, get_worker_count)
+from engine import RateLimiter, ThrottledClient, run_concurrently
+from journal import CreationJournal
+from monitor_hits import HitIndex, poll_hits
+from manage_hits import get_hit_operation
+from preflight import Preflight
+from qualification_cache import QualificationCache
+from post_hits import (get_hit_kwargs_builder, post_hit_sets, get_cost, prepare_project,
+                       log_project_review)
+
+
+class WaveScheduler:
+    """ Keep a number of sets active, posting the next wave as sets fill up.
+
+    Every step polls the active HITs, extends the HITs that expired before
+    they were filled, adapts the number of active sets to the target rate of
+    submitted assignments, and posts a wave to get back to that number. The
+    cost of every posted set counts against the budget.
+
+    Args:
+        mtc: A mturk client.
+        journal(CreationJournal): The journal of the run, started or resumed.
+        set_ids(iterable): The sets to post, in order.
+        build_hit_kwargs(callable): Returns the create_hit kwargs of a set id.
+        setup_kwargs(dict): The setup kwargs of the HITs, see get_hit_setups.
+        budget(float): The most dollars the posted sets may cost.
+        active(int): The number of active sets to begin with.
+        max_active(int): The most active sets.
+        target_rate(float): Submitted assignments per hour to aim for, or None
+            to keep the number of active sets fixed.
+        extend_hours(float): Hours to extend underfilled HITs by, or None.
+        max_extensions(int): The number of times a HIT is extended at most.
+        max_workers(int): The number of concurrent calls.
+        rate(float): The maximum number of calls per second.
+        previously_created(dict): The created HIT records of a resumed run, by set id.
+        clock(callable): Returns the time in seconds.
+    """
+
+    def __init__(self, mtc, journal, set_ids, build_hit_kwargs, setup_kwargs, budget,
+                 active=10, max_active=100, target_rate=None, extend_hours=None, max_extensions=2,
+                 max_workers=8, rate=5., previously_created=None, clock=time.time):
+        self.limiter = RateLimiter(rate)
+        # create_hits takes its own tokens and retries, so only polls and extensions are throttled here
+        self.raw_mtc = mtc
+        self.mtc = ThrottledClient(mtc, limiter=self.limiter)
+        self.journal = journal
+        self.build_hit_kwargs = build_hit_kwargs
+        self.budget = budget
+        self.set_cost = get_cost(setup_kwargs, 1)['total_cost']
+        self.active = active
+        self.max_active = max_active
+        self.target_rate = target_rate
+        self.max_workers = max_workers
+        self.clock = clock
+
+        self.extend = get_hit_operation(self.mtc, 'extend', hours=extend_hours) if extend_hours else None
+        self.max_extensions = max_extensions
+        self.extensions = {}
+
+        previously_created = previously_created or {}
+        self.todo = [set_id for set_id in set_ids if set_id not in previously_created]
+        self.created = list(previously_created.values())
+        self.index = HitIndex(hit['HITId'] for hit in self.created)
+        self.committed = len(self.created) * self.set_cost
+        self._last = None
+
+    def get_affordable(self):
+        if not self.set_cost:
+            return len(self.todo)
+        return max(0, int((self.budget - self.committed + 1e-9) // self.set_cost))
+
+    def get_underfilled_hit_ids(self, now):
+        # HITs given up on after failed polls have no state
+        return [HITId for HITId in self.index.finished
+                if self.index.states[HITId] is not None and HITId not in self.index.errors and
+                self.index.states[HITId]['available'] and not self.index.states[HITId]['pending'] and
+                self.index.states[HITId]['expiration'] is not None and
+                self.index.states[HITId]['expiration'] <= now and
+                self.extensions.get(HITId, 0) < self.max_extensions]
+
+    def get_throughput(self, now):
+        # submitted assignments per hour since the last step
+        done = self.index.totals['submitted'] + self.index.totals['completed']
+        last, self._last = self._last, (now, done)
+        if last is None or now <= last[0]:
+            return None
+        return (done - last[1]) * 3600. / (now - last[0])
+
+    def adapt(self, throughput):
+        if self.target_rate is None or throughput is None:
+            return
+        change = max(1, self.active // 4)
+        if throughput < 0.9 * self.target_rate:
+            self.active = min(self.max_active, self.active + change)
+        elif throughput > 1.1 * self.target_rate:
+            self.active = max(1, self.active - change)
+
+    def is_done(self):
+        return not self.index.get_active_hit_ids() and (not self.todo or not self.get_affordable())
+
+    def step(self):
+        """ Poll, top up, adapt and post one wave.
+
+        Returns:
+            summary(dict): What the step did and the state after it.
+        """
+        poll_hits(self.mtc, self.index, max_workers=self.max_workers)
+        now = self.clock()
+
+        # top up the sets that expired before they were filled
+        extended = 0
+        if self.extend is not None:
+            underfilled = self.get_underfilled_hit_ids(now)
+            for HITId, result in run_concurrently(self.extend, underfilled, max_workers=self.max_workers,
+                                                  return_exceptions=True):
+                self.extensions[HITId] = self.extensions.get(HITId, 0) + 1
+                if not isinstance(result, Exception):
+                    self.index.reopen(HITId)
+                    extended += 1
+
+        throughput = self.get_throughput(now)
+        self.adapt(throughput)
+
+        # post the next wave within the budget
+        n_active = len(self.index.get_active_hit_ids())
+        n_new = min(max(0, self.active - n_active), len(self.todo), self.get_affordable())
+        wave, self.todo = self.todo[:n_new], self.todo[n_new:]
+        if wave:
+            created = post_hit_sets(self.raw_mtc, self.journal, wave, self.build_hit_kwargs,
+                                    max_workers=self.max_workers, limiter=self.limiter)
+            self.created += created
+            self.committed += len(created) * self.set_cost
+            self.index.add(hit['HITId'] for hit in created)
+
+        return dict(posted=len(wave), extended=extended, active=n_active + len(wave),
+                    target_active=self.active, left=len(self.todo),
+                    throughput=throughput, committed=self.committed, **self.index.totals)
+
+    def run(self, interval=60., sleep=time.sleep, max_steps=None):
+        """ Step until every affordable set is posted and finished.
+
+        Yields:
+            summary(dict): The summary of every step.
+        """
+        steps = 0
+        while True:
+            yield self.step()
+            steps += 1
+            if self.is_done() or (max_steps and steps >= max_steps):
+                return
+            sleep(interval)
+
+
+SCHEDULE_HEADER = '%8s %7s %8s %8s %6s %9s %9s %9s %10s' % (
+    'time', 'posted', 'extended', 'active', 'left', 'submit', 'reviewed', 'per hour', 'committed')
+
+
+def get_schedule_row(summary):
+    return '%8s %7d %8d %4d/%-3d %6d %9d %9d %9s %10s' % (
+        time.strftime('%H:%M:%S'), summary['posted'], summary['extended'], summary['active'],
+        summary['target_active'], summary['left'], summary['submitted'], summary['completed'],
+        '-' if summary['throughput'] is None else '%.1f' % summary['throughput'],
+        '$%.2f' % summary['committed'])
+
+
+SIMULATION_INFO = dict(title='Simulation', description='A simulated HIT', keywords='simulation')
+SIMULATION_SETUP = dict(reward='0.50', max_assignments='3', assignment_duration_in_mins='30',
+                        lifetime_in_hours='1', auto_approval_delay_in_hours='48')
+
+
+def simulate_schedule(n_sets=100, budget=100., active=10, max_active=40, target_rate=None,
+                      workers_per_step=10, lifetime=2., interval=0.5, seed=0):
+    """ Run the scheduler against the fake client, with simulated workers.
+
+    HITs live lifetime seconds, so that some expire underfilled and are
+    extended, and workers_per_step assignments are submitted between steps.
+
+    Yields:
+        summary(dict): The summary of every step.
+    """
+    from fake_mtc import FakeMTurkClient
+
+    mtc = FakeMTurkClient(seed=seed)
+    setup_kwargs = get_hit_setups(SIMULATION_SETUP)
+    build_hit_kwargs = get_hit_kwargs_builder('simulation', get_hit_descriptions(SIMULATION_INFO),
+                                              setup_kwargs, [])
+
+    def build_short_hit_kwargs(set_id):
+        return dict(build_hit_kwargs(set_id), LifetimeInSeconds=lifetime)
+
+    def sleep(seconds):
+        time.sleep(seconds)
+        mtc.simulate_workers(workers_per_step)
+
+    with tempfile.TemporaryDirectory() as tmp_path:
+        journal = CreationJournal(os.path.join(tmp_path, 'simulation.journal'),
+                                  'simulation', 'simulation', 'fake')
+        journal.start_run()
+        scheduler = WaveScheduler(mtc, journal, range(n_sets), build_short_hit_kwargs, setup_kwargs,
+                                  budget, active=active, max_active=max_active, target_rate=target_rate,
+                                  extend_hours=lifetime / 3600., rate=50.)
+        yield from scheduler.run(interval=interval, sleep=sleep)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    # create parser object
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--project', type=str,
+                        help='Which project to post?')
+    parser.add_argument('--account', type=str,
+                        help='Which requester account to use?')
+    parser.add_argument('--host', type=str, default='sandbox',
+                        help='Which platform to host, sandbox or formal?')
+    parser.add_argument('--budget', type=float,
+                        help='How many dollars may the posted sets cost at most?')
+    parser.add_argument('--active', type=int, default=10,
+                        help='How many sets to keep active to begin with?')
+    parser.add_argument('--max_active', type=int, default=100,
+                        help='How many sets to keep active at most?')
+    parser.add_argument('--target_rate', type=float,
+                        help='How many submitted assignments per hour to aim for?')
+    parser.add_argument('--extend_hours', type=float,
+                        help='How many hours to extend the HITs that expire underfilled by?')
+    parser.add_argument('--max_extensions', type=int, default=2,
+                        help='How many times to extend a HIT at most?')
+    parser.add_argument('--interval', type=float, default=60.,
+                        help='How many seconds between steps?')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue the last run of the project?')
+    parser.add_argument('--workers', type=get_worker_count, default=8,
+                        help='How many calls to run concurrently?')
+    parser.add_argument('--rate', type=float, default=5.,
+                        help='How many calls per second at most?')
+    parser.add_argument('--simulate', type=int,
+                        help='How many sets to schedule against the fake client, instead of a project?')
+
+    # parse terminal inputs
+    args = parser.parse_args()
+    if args.budget is None:
+        parser.error('--budget is required')
+
+    logger = set_logging_configs(__name__)
+    if args.simulate:
+        logger.info('\nSimulating %d sets\n' % args.simulate + SCHEDULE_HEADER)
+        for summary in simulate_schedule(args.simulate, budget=args.budget, active=args.active,
+                                         max_active=args.max_active, target_rate=args.target_rate):
+            logger.info(get_schedule_row(summary))
+        raise SystemExit(0)
+
+    # check the project like postHITs does
+    with Preflight() as preflight:
+        mtc_future = preflight.submit('make_mtc', make_mtc, args.account, args.host)
+        project = prepare_project(args.project, args.account, args.host, preflight, mtc_future,
+                                  resume=args.resume, cache=QualificationCache(args.account, args.host))
+        cost = log_project_review(logger, project, args.account, args.host)
+        mtc = mtc_future.result()
+
+    logger.info('\nWaves of %d to %d sets, %s, under a budget of $%.2f (all sets: $%.2f)\n' % (
+        args.active, args.max_active,
+        'aiming at %.1f assignments per hour' % args.target_rate if args.target_rate else 'a fixed number',
+        args.budget, cost['total_cost']))
+    flush_logging(__name__)
+
+    notice = '\nDo you want to start posting %s for %s %s? [y/n]: ' % (
+        args.project, args.account.upper(), args.host.upper())
+    if not is_confirmed(notice):
+        raise SystemExit(0)
+
+    journal = project['journal']
+    if journal.run is None:
+        journal.start_run()
+    build_hit_kwargs = get_hit_kwargs_builder(
+        project['name'], project['description_kwargs'], project['setup_kwargs'],
+        project['requirement_kwarg_list'], with_hit_set=project['with_hit_set'])
+    scheduler = WaveScheduler(mtc, journal, project['all_hit_set_ids'], build_hit_kwargs,
+                              project['setup_kwargs'], args.budget, active=args.active,
+                              max_active=args.max_active, target_rate=args.target_rate,
+                              extend_hours=args.extend_hours, max_extensions=args.max_extensions,
+                              max_workers=args.workers, rate=args.rate,
+                              previously_created=project['previously_created'])
+
+    logger.info(SCHEDULE_HEADER)
+    for summary in scheduler.run(interval=args.interval):
+        logger.info(get_schedule_row(summary))
+        log_event(logger, 'wave', project=args.project, **summary)
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+# the modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import helpers  # noqa: E402
+import post_hits  # noqa: E402
+
+
+HIT_CONFIG = """[INFO]
+title = Demo
+description = A demo HIT
+keywords = demo
+
+[SETUP]
+reward = 0.10
+max_assignments = 1
+assignment_duration_in_mins = 10
+lifetime_in_hours = 1
+auto_approval_delay_in_hours = 1
+
+[HITSET]
+HSetId = %s
+"""
+
+
+@pytest.fixture
+def make_project(tmp_path, monkeypatch):
+    """ Return a function that writes a project under a temporary WORK_PATH. """
+    monkeypatch.setattr(post_hits, 'WORK_PATH', str(tmp_path))
+    monkeypatch.setattr(post_hits, 'is_confirmed', lambda notice: True)
+
+    def make(name, HSetId='1-20', extra_config=''):
+        project_path = post_hits.get_project_path(name)
+        os.makedirs(project_path)
+        with open(os.path.join(project_path, post_hits.LANDING_FILE), 'w') as f:
+            f.write('<html></html>')
+        with open(os.path.join(project_path, post_hits.CONFIG_FILE), 'w') as f:
+            f.write(HIT_CONFIG % HSetId + extra_config)
+        return project_path
+
+    yield make
+    helpers.clear_mtc_registry()
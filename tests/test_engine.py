@@ -0,0 +1,158 @@
+import time
+import threading
+
+import pytest
+
+from engine import RateLimiter, ThrottledClient, call_with_retries, create_hits, run_concurrently
+from fake_mtc import FakeClientError, FakeMTurkClient
+
+
+def failing(errors):
+    """ A call that raises the given errors one after the other, then returns 'ok'. """
+    errors = list(errors)
+    calls = []
+
+    def call(**kwargs):
+        calls.append(kwargs)
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+    return call, calls
+
+
+class HTTPClientError(Exception):
+    """ Named like botocore's base class of connection errors. """
+
+
+class EndpointConnectionError(HTTPClientError):
+    pass
+
+
+@pytest.mark.parametrize('error', [
+    FakeClientError('ThrottlingException', 'Rate exceeded'),
+    FakeClientError('ServiceFault', 'Injected failure'),
+    ConnectionResetError(),
+    EndpointConnectionError(),
+])
+def test_retry_transient_errors(error):
+    call, calls = failing([error, error])
+    retries = []
+    assert call_with_retries(call, dict(a=1), base_delay=0.001,
+                             on_retry=lambda *args: retries.append(args)) == 'ok'
+    assert len(calls) == 3 and len(retries) == 2
+
+
+def test_retry_5xx():
+    error = FakeClientError('SomethingElse', 'Bad gateway')
+    error.response['ResponseMetadata'] = {'HTTPStatusCode': 502}
+    call, calls = failing([error])
+    assert call_with_retries(call, {}, base_delay=0.001) == 'ok'
+
+
+def test_do_not_retry_request_errors():
+    call, calls = failing([FakeClientError('RequestError', 'Hit does not exist.')])
+    with pytest.raises(FakeClientError):
+        call_with_retries(call, {}, base_delay=0.001)
+    assert len(calls) == 1
+
+
+def test_give_up_after_max_retries():
+    call, calls = failing([FakeClientError('ServiceFault', 'Injected failure')] * 5)
+    with pytest.raises(FakeClientError):
+        call_with_retries(call, {}, base_delay=0.001, max_retries=2)
+    assert len(calls) == 3
+
+
+def test_create_hits_reports_failed_sets():
+    def create_hit(SetId):
+        if SetId % 3 == 0:
+            raise FakeClientError('RequestError', 'Invalid HIT.', 'CreateHIT')
+        return {'HIT': {'HITId': 'H%d' % SetId, 'HITGroupId': 'G'}}
+
+    failed = []
+    created = create_hits(None, range(10), lambda set_id: dict(SetId=set_id), rate=None,
+                          create_func=create_hit, on_failed=lambda set_id, err: failed.append(set_id))
+    assert [record['SetId'] for record in created] == [1, 2, 4, 5, 7, 8]
+    assert failed == [0, 3, 6, 9]
+
+    # without on_failed the first failure stops the posting
+    with pytest.raises(FakeClientError):
+        create_hits(None, range(10), lambda set_id: dict(SetId=set_id), rate=None, create_func=create_hit)
+
+
+def test_run_concurrently_keeps_input_order():
+    def slow(item):
+        # the first items take the longest
+        time.sleep(0.002 * (20 - item))
+        return item * item
+
+    results = list(run_concurrently(slow, range(20), max_workers=8))
+    assert results == [(item, item * item) for item in range(20)]
+
+
+def test_run_concurrently_bounds_pending_items():
+    pulled = []
+
+    def items():
+        for item in range(100):
+            pulled.append(item)
+            yield item
+
+    started = threading.Event()
+
+    def wait(item):
+        started.wait()
+        return item
+
+    results = run_concurrently(wait, items(), max_workers=2, max_pending=4)
+    threading.Timer(0.05, started.set).start()
+    assert next(results) == (0, 0)
+    assert len(pulled) <= 5
+    assert [item for item, _ in results] == list(range(1, 100))
+
+
+def test_run_concurrently_stops_at_the_first_error():
+    done = []
+
+    def fail_at_3(item):
+        if item == 3:
+            raise ValueError(item)
+        done.append(item)
+        return item
+
+    with pytest.raises(ValueError):
+        list(run_concurrently(fail_at_3, range(1000), max_workers=2, max_pending=4))
+    assert len(done) < 20
+
+
+def test_rate_limiter():
+    limiter = RateLimiter(rate=100, burst=1)
+    start = time.monotonic()
+    for _ in range(11):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.09
+
+    # no rate, no waiting
+    limiter = RateLimiter(rate=None)
+    start = time.monotonic()
+    for _ in range(1000):
+        limiter.acquire()
+    assert time.monotonic() - start < 0.1
+
+
+def test_throttled_client_retries_throttled_calls():
+    fake = FakeMTurkClient(throttle_rate=0.3, seed=1)
+    mtc = ThrottledClient(fake, rate=None)
+    for _ in range(10):
+        assert mtc.get_account_balance()['AvailableBalance'] == '10000.00'
+    assert fake.calls['GetAccountBalance'] > 10
+
+
+def test_create_hits_in_set_order_under_throttling():
+    mtc = FakeMTurkClient(latency_jitter=0.005, throttle_rate=0.2, failure_rate=0.05, seed=0)
+    created = create_hits(mtc, range(50), lambda set_id: dict(Title='set %d' % set_id,
+                                                              UniqueRequestToken='t%d' % set_id),
+                          max_workers=8, rate=None)
+    assert [record['SetId'] for record in created] == list(range(50))
+    assert len(mtc.hits) == 50
+    assert sum(record['Retries'] for record in created) > 0
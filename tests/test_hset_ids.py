@@ -0,0 +1,51 @@
+import pytest
+
+from helpers import HSetIdRange, parse_HSetId_str
+
+
+@pytest.mark.parametrize('spec, expected', [
+    ('7', [7]),
+    ('3:6', [3, 4, 5, 6]),
+    ('3-6', [3, 4, 5, 6]),
+    ('5,1,3', [1, 3, 5]),
+    ('1-5, 3-8, 8', list(range(1, 9))),
+    ('1-10,!3-4,!9', [1, 2, 5, 6, 7, 8, 10]),
+    ('!2,1-3', [1, 3]),
+])
+def test_parse_HSetId_str(spec, expected):
+    # ids are posted in ascending order, whatever the order of the spec
+    assert list(parse_HSetId_str(spec)) == expected
+
+
+@pytest.mark.parametrize('spec', ['', 'a', '5-3', '1,,2', '1-2-3'])
+def test_parse_HSetId_str_rejects(spec):
+    with pytest.raises(RuntimeError):
+        parse_HSetId_str(spec)
+
+
+def test_hset_id_range():
+    hit_set_ids = parse_HSetId_str('1-500,612,700:900')
+    assert len(hit_set_ids) == 500 + 1 + 201
+    assert str(hit_set_ids) == '1-500, 612, 700-900'
+    assert 612 in hit_set_ids and 611 not in hit_set_ids and 0 not in hit_set_ids
+    assert hit_set_ids == HSetIdRange([(700, 900), (1, 500), (612, 612)])
+
+
+def test_difference():
+    hit_set_ids = HSetIdRange([(1, 10), (20, 30)])
+    assert list(hit_set_ids.difference([1, 5, 6, 10, 25, 40])) == [2, 3, 4, 7, 8, 9] + list(range(20, 25)) + \
+        list(range(26, 31))
+    assert hit_set_ids.difference([]) == hit_set_ids
+    assert not hit_set_ids.difference(hit_set_ids)
+
+
+def test_difference_of_a_large_range():
+    hit_set_ids = HSetIdRange([(1, 100000)])
+    left = hit_set_ids.difference(range(1, 100001, 2))
+    assert len(left) == 50000
+    assert list(left)[:3] == [2, 4, 6]
+
+
+def test_split():
+    shards = parse_HSetId_str('1-5,10-14').split([3, 4, 3])
+    assert [list(shard) for shard in shards] == [[1, 2, 3], [4, 5, 10, 11], [12, 13, 14]]
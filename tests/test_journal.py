@@ -0,0 +1,115 @@
+import pytest
+
+from fake_mtc import FakeClientError, FakeMTurkClient
+from helpers import get_hit_descriptions, get_hit_setups, register_mtc
+from journal import CreationJournal, get_existing_hit_id
+from post_hits import get_hit_kwargs_builder, post_hit_sets, postHITs, postShardedHITs
+
+
+class CrashingClient(FakeMTurkClient):
+    """ Creates the HIT of the crash_at-th call, then fails before the result is journaled. """
+
+    def __init__(self, crash_at, **kwargs):
+        super().__init__(**kwargs)
+        self.crash_at = crash_at
+        self.n_creates = 0
+
+    def create_hit(self, **kwargs):
+        hit = super().create_hit(**kwargs)
+        self.n_creates += 1
+        if self.n_creates == self.crash_at:
+            raise KeyboardInterrupt
+        return hit
+
+
+class WordedClient(CrashingClient):
+    """ Reports a reused token in its own words, like MTurk does. """
+
+    def create_hit(self, **kwargs):
+        token = kwargs.get('UniqueRequestToken')
+        if token in self.tokens:
+            raise FakeClientError('RequestError', 'You have already submitted a request with the '
+                                  'same parameters (%s).' % self.tokens[token], 'CreateHIT')
+        return super().create_hit(**kwargs)
+
+
+def get_build_hit_kwargs():
+    return get_hit_kwargs_builder(
+        'demo', get_hit_descriptions(dict(title='Demo', description='A demo HIT', keywords='demo')),
+        get_hit_setups(dict(reward='0.10', max_assignments='1', assignment_duration_in_mins='10',
+                            lifetime_in_hours='1', auto_approval_delay_in_hours='1')), [])
+
+
+def test_resume_after_a_crash(tmp_path):
+    mtc = CrashingClient(crash_at=5)
+    journal = CreationJournal(str(tmp_path / 'demo.journal'), 'demo', 'lab', 'sandbox')
+    journal.start_run()
+    with pytest.raises(KeyboardInterrupt):
+        post_hit_sets(mtc, journal, range(10), get_build_hit_kwargs(), max_workers=1, rate=None)
+    assert len(mtc.hits) >= 5
+
+    # the crashed set was created but never journaled
+    journal = CreationJournal(str(tmp_path / 'demo.journal'), 'demo', 'lab', 'sandbox')
+    created = journal.resume()
+    assert {0, 1, 2, 3} <= set(created) and 4 not in created
+
+    todo = [set_id for set_id in range(10) if set_id not in created]
+    post_hit_sets(mtc, journal, todo, get_build_hit_kwargs(), max_workers=4, rate=None)
+
+    # the request of the crashed set is sent again with its token and finds its HIT
+    assert len(mtc.hits) == 10
+    records = journal.resume()
+    assert sorted(records) == list(range(10))
+    assert len({record['HITId'] for record in records.values()}) == 10
+
+
+def test_resume_finds_the_hit_of_a_reused_token(tmp_path):
+    mtc = WordedClient(crash_at=1)
+    journal = CreationJournal(str(tmp_path / 'demo.journal'), 'demo', 'lab', 'sandbox')
+    journal.start_run()
+    with pytest.raises(KeyboardInterrupt):
+        post_hit_sets(mtc, journal, [7], get_build_hit_kwargs(), max_workers=1, rate=None)
+
+    journal.resume()
+    created = post_hit_sets(mtc, journal, [7], get_build_hit_kwargs(), max_workers=1, rate=None)
+    assert len(mtc.hits) == 1
+    assert created[0]['HITId'] == next(iter(mtc.hits))
+
+
+def test_get_existing_hit_id():
+    HITId = '3R0T90IZ1SBVX6CVAOLW7NXWM0LCGB'
+    assert get_existing_hit_id(FakeClientError(
+        'RequestError', 'The HIT with ID %s already exists.' % HITId)) == HITId
+    assert get_existing_hit_id(FakeClientError('RequestError', 'Hit does not exist.')) is None
+    assert get_existing_hit_id(FakeClientError('ServiceFault', 'Failed for %s.' % HITId)) is None
+    assert get_existing_hit_id(KeyError('HIT')) is None
+
+
+def test_resume_without_a_run(tmp_path):
+    journal = CreationJournal(str(tmp_path / 'demo.journal'), 'demo', 'lab', 'sandbox')
+    with pytest.raises(RuntimeError):
+        journal.resume()
+
+
+def test_resume_a_sharded_run(make_project):
+    make_project('demo', HSetId='1-20')
+    clients = dict(alvarezlab=FakeMTurkClient(balance='300'), konklab=FakeMTurkClient(balance='100'))
+    for account, mtc in clients.items():
+        register_mtc(account, 'formal', mtc)
+
+    HITIds = postShardedHITs('demo', list(clients), 'formal', use_cache=False)
+    assert {account: len(ids) for account, ids in HITIds.items()} == dict(alvarezlab=15, konklab=5)
+
+    # a resume of one account stays within its shard
+    assert len(postHITs('demo', 'konklab', 'formal', resume=True, use_cache=False)) == 5
+    assert len(clients['konklab'].hits) == 5
+
+
+def test_resume_with_nothing_left(make_project):
+    make_project('demo', HSetId='1-30')
+    register_mtc('konklab', 'sandbox', FakeMTurkClient(latency=0.001, latency_jitter=0.01, seed=1))
+
+    HITIds = postHITs('demo', 'konklab', 'sandbox', rate=0, use_cache=False)
+    assert len(HITIds) == 30
+    # in set order, like the first run, not in the order the sets were journaled
+    assert postHITs('demo', 'konklab', 'sandbox', resume=True, use_cache=False) == HITIds
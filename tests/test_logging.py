@@ -0,0 +1,42 @@
+import json
+import logging
+
+import pytest
+
+from helpers import flush_logging, log_event, set_logging_configs, stop_logging
+
+
+@pytest.fixture
+def module_name():
+    yield 'test_logging_module'
+    stop_logging('test_logging_module')
+
+
+def test_configuring_again_does_not_duplicate_records(tmp_path, module_name):
+    log_path = str(tmp_path / 'run.log')
+    for _ in range(3):
+        logger = set_logging_configs(module_name, stream=False, save_log_path=log_path)
+    assert len(logging.getLogger(module_name).handlers) == 1
+
+    logger.info('posted')
+    flush_logging(module_name)
+    with open(log_path) as f:
+        assert f.read().count('posted') == 1
+
+
+def test_events_go_to_their_own_file(tmp_path, module_name):
+    log_path = str(tmp_path / 'run.log')
+    logger = set_logging_configs(module_name, stream=False, save_log_path=log_path)
+    logger.info('a text line')
+    log_event(logger, 'hit_created', HITId='H1', SetId=1)
+    log_event(logger, 'cancelled', message='The task is cancelled', project='demo')
+    stop_logging(module_name)
+
+    with open(log_path) as f:
+        text = f.read()
+    assert 'a text line' in text and 'The task is cancelled' in text and 'hit_created' not in text
+
+    with open(str(tmp_path / 'run.events.jsonl')) as f:
+        events = [json.loads(line) for line in f]
+    assert [event['event'] for event in events] == ['hit_created', 'cancelled']
+    assert events[0]['HITId'] == 'H1' and events[1]['project'] == 'demo'
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from fake_mtc import FakeMTurkClient
+from manage_hits import manage_hits
+
+
+@pytest.fixture
+def eastern_time(monkeypatch):
+    # naive local datetimes would be hours off from UTC here
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def create_hits(mtc, n, lifetime=60):
+    return [mtc.create_hit(Title='Demo', Description='A demo HIT', Keywords='demo', Reward='0.10',
+                           Question='<xml/>', MaxAssignments=1, LifetimeInSeconds=lifetime,
+                           AssignmentDurationInSeconds=600)['HIT']['HITId'] for _ in range(n)]
+
+
+def test_extend(eastern_time):
+    mtc = FakeMTurkClient()
+    HITIds = create_hits(mtc, 3)
+    summary = manage_hits(mtc, HITIds, 'extend', hours=2, rate=None)
+    assert summary['succeeded'] == 3 and summary['rounds'] == 1
+
+    for HITId in HITIds:
+        assert mtc.hits[HITId]['Expiration'] == pytest.approx(time.time() + 2 * 3600, abs=60)
+        assert mtc.hits[HITId]['HITStatus'] == 'Assignable'
+
+
+def test_extend_reopens_expired_hits(eastern_time):
+    mtc = FakeMTurkClient()
+    HITIds = create_hits(mtc, 2, lifetime=0)
+    summary = manage_hits(mtc, HITIds, 'extend', hours=1, rate=None)
+    assert summary['succeeded'] == 2
+    assert all(mtc.hits[HITId]['HITStatus'] == 'Assignable' for HITId in HITIds)
+
+
+def test_expire(eastern_time):
+    mtc = FakeMTurkClient()
+    HITIds = create_hits(mtc, 2)
+    summary = manage_hits(mtc, HITIds, 'expire', rate=None)
+    assert summary['succeeded'] == 2
+    assert all(mtc.hits[HITId]['Expiration'] <= time.time() for HITId in HITIds)
+
+
+def test_failures_are_retried_and_reported():
+    mtc = FakeMTurkClient()
+    HITIds = create_hits(mtc, 2) + ['H' + '9' * 29]
+    summary = manage_hits(mtc, HITIds, 'extend', hours=1, rate=None, max_rounds=2, sleep=lambda seconds: None)
+    assert summary['succeeded'] == 2 and summary['failed'] == 1 and summary['rounds'] == 2
+    assert list(summary['failures']) == ['H' + '9' * 29]
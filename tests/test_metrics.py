@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+from engine import call_with_retries
+from fake_mtc import FakeClientError
+from metrics import API_METRICS
+
+
+class StubEvents:
+    """ The part of botocore's event system that ApiMetrics registers with. """
+
+    def __init__(self):
+        self.handlers = []
+
+    def register(self, event_name, handler):
+        self.handlers.append((event_name, handler))
+
+    def register_first(self, event_name, handler):
+        self.handlers.insert(0, (event_name, handler))
+
+    def emit(self, event_name, **kwargs):
+        for name, handler in self.handlers:
+            if event_name.startswith(name + '.'):
+                handler(event_name=event_name, **kwargs)
+
+
+class StubClient:
+    """ Emits the events of a botocore client, throttling the first n_throttles calls. """
+
+    def __init__(self, n_throttles):
+        self.meta = SimpleNamespace(events=StubEvents())
+        self.n_throttles = n_throttles
+
+    def create_hit(self, **kwargs):
+        event = '%s.mturk.CreateHIT'
+        context = {}
+        self.meta.events.emit(event % 'before-call', context=context)
+        self.meta.events.emit(event % 'before-send', request=SimpleNamespace(body=b'x' * 10))
+        if self.n_throttles:
+            self.n_throttles -= 1
+            parsed = {'Error': {'Code': 'ThrottlingException', 'Message': 'Rate exceeded'}}
+        else:
+            parsed = {'HIT': {'HITId': 'H'}}
+        self.meta.events.emit(event % 'needs-retry', response=(None, parsed))
+        self.meta.events.emit(event % 'after-call', parsed=parsed, context=context)
+        if 'Error' in parsed:
+            raise FakeClientError(parsed['Error']['Code'], parsed['Error']['Message'], 'CreateHIT')
+        return parsed
+
+
+def test_engine_retries_are_recorded():
+    API_METRICS.reset()
+    mtc = API_METRICS.attach(StubClient(n_throttles=2))
+    call_with_retries(mtc.create_hit, {}, base_delay=0.001)
+    call_with_retries(mtc.create_hit, {}, base_delay=0.001)
+
+    operation = API_METRICS.summarize()['operations']['CreateHIT']
+    assert operation['count'] == 2
+    assert operation['errors'] == 0
+    assert operation['retries'] == 2
+    assert operation['throttles'] == 2
+    assert operation['attempts'] == 4
+    assert operation['bytes_sent'] == 40
+    assert len(operation['latency']) and operation['latency']['p50'] is not None
+    assert 'CreateHIT' in API_METRICS.get_review()
+    API_METRICS.reset()
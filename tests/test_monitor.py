@@ -0,0 +1,61 @@
+from fake_mtc import FakeMTurkClient
+from monitor_hits import HitIndex, monitor_hits
+
+
+def post(mtc, n_hits, max_assignments=2):
+    return [mtc.create_hit(Title='demo', MaxAssignments=max_assignments,
+                           LifetimeInSeconds=3600)['HIT']['HITId'] for _ in range(n_hits)]
+
+
+def test_index_totals_follow_the_changes():
+    mtc = FakeMTurkClient()
+    HITIds = post(mtc, 3)
+    index = HitIndex(HITIds)
+    for HITId in HITIds:
+        assert index.update(mtc.get_hit(HITId=HITId)['HIT'])
+    assert index.totals == dict(available=6, pending=0, submitted=0, completed=0)
+
+    mtc.add_assignment(HITIds[0], 'W1')
+    assert index.update(mtc.get_hit(HITId=HITIds[0])['HIT'])
+    assert not index.update(mtc.get_hit(HITId=HITIds[1])['HIT'])
+    assert index.totals == dict(available=5, pending=0, submitted=1, completed=0)
+    assert not index.finished
+
+    mtc.add_assignment(HITIds[0], 'W2', status='Approved')
+    index.update(mtc.get_hit(HITId=HITIds[0])['HIT'])
+    assert index.totals == dict(available=4, pending=0, submitted=1, completed=1)
+    assert index.finished == {HITIds[0]}
+
+
+def test_monitor_until_every_hit_is_finished():
+    mtc = FakeMTurkClient()
+    HITIds = post(mtc, 4, max_assignments=1)
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        # a worker takes one HIT every other poll
+        if len(waits) % 2 == 0:
+            mtc.simulate_workers(1)
+
+    polls = list(monitor_hits(mtc, HITIds, interval=1., max_interval=4., rate=None, sleep=sleep))
+    index, _, last_wait = polls[-1]
+    assert last_wait is None
+    assert index.finished == set(HITIds)
+    assert index.totals['submitted'] == 4
+    # the wait backs off while nothing changes, and goes back to interval after a change
+    assert waits[:4] == [1., 2., 1., 2.]
+
+
+def test_monitor_gives_up_on_a_deleted_hit():
+    mtc = FakeMTurkClient()
+    HITIds = post(mtc, 2)
+    del mtc.hits[HITIds[1]]
+
+    polls = list(monitor_hits(mtc, HITIds, rate=None, max_polls=10, sleep=lambda seconds: None))
+    index = polls[-1][0]
+    assert len(polls) == 10
+    assert HITIds[1] in index.finished and HITIds[1] in index.errors
+    assert HITIds[0] not in index.finished
+    # the deleted HIT is not polled again once it is given up on
+    assert mtc.calls['GetHIT'] == 10 + HitIndex.MAX_ERRORS
@@ -0,0 +1,42 @@
+import pytest
+
+from fake_mtc import FakeMTurkClient
+from helpers import (count_workers_with_qualification_type, get_review, iter_assignments_for_hit,
+                     iter_hits_in_group)
+
+
+@pytest.mark.parametrize('n_workers', [0, 1, 100, 101, 250])
+def test_count_every_page_of_workers(n_workers):
+    mtc = FakeMTurkClient()
+    qt_id = mtc.add_qualification_type('done before', ['W%d' % i for i in range(n_workers)])
+    assert count_workers_with_qualification_type(mtc, qt_id) == n_workers
+    # pages of 100, and a single empty page when there are no workers
+    assert mtc.calls['ListWorkersWithQualificationType'] == max(1, -(-n_workers // 100))
+
+
+def test_review_counts_more_than_one_page():
+    mtc = FakeMTurkClient()
+    qt_id = mtc.add_qualification_type('done before', ['W%d' % i for i in range(230)])
+    review = get_review('exclude_qualification_type', dict(id=qt_id), mtc=mtc)
+    assert "You've excluded 230 Workers with **done before**" in review
+
+
+def test_iter_assignments_for_hit():
+    mtc = FakeMTurkClient()
+    HITId = mtc.create_hit(Title='demo', MaxAssignments=300, LifetimeInSeconds=3600)['HIT']['HITId']
+    for i in range(230):
+        mtc.add_assignment(HITId, 'W%d' % i, status='Approved' if i % 2 else 'Submitted')
+
+    assert [a['WorkerId'] for a in iter_assignments_for_hit(mtc, HITId)] == ['W%d' % i for i in range(230)]
+    assert len(list(iter_assignments_for_hit(mtc, HITId, statuses=['Submitted']))) == 115
+    assert len(list(iter_assignments_for_hit(mtc, HITId, page_size=7))) == 230
+
+
+def test_iter_hits_in_group():
+    mtc = FakeMTurkClient()
+    for i in range(150):
+        mtc.create_hit(Title='A' if i % 3 else 'B', LifetimeInSeconds=3600)
+    group_ids = {hit['Title']: hit['HITGroupId'] for hit in mtc.hits.values()}
+
+    assert len(list(iter_hits_in_group(mtc, group_ids['A']))) == 100
+    assert len(list(iter_hits_in_group(mtc, group_ids['B'], page_size=40))) == 50
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+import plan_hits
+from fake_mtc import FakeMTurkClient
+from helpers import register_mtc
+from plan_hits import apply_plan, compile_plan, load_plan, save_plan
+
+
+@pytest.fixture
+def plan_path(make_project, monkeypatch, tmp_path):
+    monkeypatch.setattr(plan_hits, 'is_confirmed', lambda notice: True)
+    register_mtc('lab', 'sandbox', FakeMTurkClient())
+    make_project('demo', HSetId='1-5')
+
+    path = str(tmp_path / 'demo.plan.json')
+    save_plan(compile_plan('demo', 'lab', 'sandbox', use_cache=False), path)
+    return path
+
+
+def edit_plan(path, **changes):
+    with open(path) as f:
+        plan = json.load(f)
+    plan.update(changes)
+    with open(path, 'w') as f:
+        json.dump(plan, f)
+
+
+def test_apply_a_saved_plan(plan_path):
+    plan = load_plan(plan_path)
+    assert plan['cost']['n_sets'] == 5
+
+    HITIds = apply_plan(plan, rate=None)
+    assert len(HITIds) == 5
+
+    # a resume with nothing left returns the same HITs, in plan order
+    assert apply_plan(plan, rate=None, resume=True) == HITIds
+
+
+def test_reject_an_edited_plan(plan_path):
+    edit_plan(plan_path, setup_kwargs=dict(load_plan(plan_path)['setup_kwargs'], Reward='10.00'))
+    with pytest.raises(RuntimeError, match='changed since it was compiled'):
+        load_plan(plan_path)
+
+
+def test_reject_a_plan_of_another_version(plan_path):
+    plan = load_plan(plan_path)
+    edit_plan(plan_path, version=plan['version'] + 1)
+    with pytest.raises(RuntimeError, match='compile it again'):
+        load_plan(plan_path)
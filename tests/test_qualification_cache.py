@@ -0,0 +1,51 @@
+import threading
+
+from qualification_cache import QualificationCache
+
+
+def test_get_and_set(tmp_path):
+    cache = QualificationCache('lab', 'sandbox', path=str(tmp_path / 'cache.json'))
+    assert cache.get('QT1') is None
+    cache.set('QT1', 'done before', 12)
+    entry = cache.get('QT1')
+    assert (entry['Name'], entry['NumWorkers']) == ('done before', 12)
+
+    # entries are kept per account
+    assert QualificationCache('other', 'sandbox', path=cache.path).get('QT1') is None
+
+    cache.invalidate('QT1')
+    assert cache.get('QT1') is None
+
+
+def test_expiry_and_eviction(tmp_path):
+    cache = QualificationCache('lab', 'sandbox', path=str(tmp_path / 'cache.json'), max_entries=2)
+    for i in range(3):
+        cache.set('QT%d' % i, 'qualification %d' % i, i)
+    assert cache.get('QT0') is None
+    assert cache.get('QT2')['NumWorkers'] == 2
+
+    cache.ttl = -1
+    assert cache.get('QT2') is None
+
+
+def test_caches_of_several_accounts(tmp_path):
+    # like a sharded posting, one cache per account on one file
+    path = str(tmp_path / 'cache.json')
+    errors = []
+
+    def use(account):
+        cache = QualificationCache(account, 'sandbox', path=path)
+        try:
+            for i in range(100):
+                cache.set('QT%d' % (i % 5), 'qualification', i)
+                cache.get('QT%d' % (i % 5))
+        except Exception as err:
+            errors.append(err)
+
+    threads = [threading.Thread(target=use, args=(account,)) for account in ('a', 'b', 'c')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['cache.json']
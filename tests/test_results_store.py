@@ -0,0 +1,59 @@
+import pytest
+
+from fake_mtc import FakeMTurkClient
+from results_store import ResultsStore
+
+
+@pytest.fixture
+def posted(tmp_path):
+    """ A store of 5 HITs with 2 submitted assignments each. """
+    mtc = FakeMTurkClient()
+    hits = []
+    for set_id in range(5):
+        hit = mtc.create_hit(Title='demo', MaxAssignments=4, LifetimeInSeconds=3600)['HIT']
+        hits.append(dict(SetId=set_id, HITId=hit['HITId'], HITGroupId=hit['HITGroupId']))
+        for worker in range(2):
+            mtc.add_assignment(hit['HITId'], 'W%d%d' % (set_id, worker))
+
+    store = ResultsStore(str(tmp_path / 'results.sqlite3'))
+    store.add_hits(hits)
+    yield mtc, store, hits
+    store.close()
+
+
+def test_first_sync_lists_every_hit(posted):
+    mtc, store, hits = posted
+    counts = store.sync(mtc, rate=None)
+    assert (counts['checked'], counts['listed'], counts['inserted']) == (5, 5, 10)
+    assert len(store.get_assignments(status='Submitted')) == 10
+    assert [row['n'] for row in store.get_set_summary()] == [2] * 5
+
+
+def test_sync_only_lists_changed_hits(posted):
+    mtc, store, hits = posted
+    store.sync(mtc, rate=None)
+
+    counts = store.sync(mtc, rate=None)
+    assert (counts['checked'], counts['listed'], counts['inserted'], counts['updated']) == (5, 0, 0, 0)
+    assert mtc.calls['ListAssignmentsForHIT'] == 5
+
+    # a review and a new assignment change the signature of two HITs
+    mtc.approve_assignment(AssignmentId=mtc.assignments[hits[0]['HITId']][0]['AssignmentId'])
+    mtc.add_assignment(hits[3]['HITId'], 'W99')
+    counts = store.sync(mtc, rate=None)
+    assert (counts['listed'], counts['inserted'], counts['updated'], counts['unchanged']) == (2, 1, 1, 3)
+    assert mtc.calls['ListAssignmentsForHIT'] == 7
+    assert len(store.get_assignments(status='Approved')) == 1
+    assert store.get_worker_assignments('W99')[0]['SetId'] == '3'
+
+    # a full sync lists every HIT again, but writes nothing new
+    counts = store.sync(mtc, full=True, rate=None)
+    assert (counts['listed'], counts['inserted'], counts['updated']) == (5, 0, 0)
+
+
+def test_sync_goes_on_past_a_missing_hit(posted):
+    mtc, store, hits = posted
+    del mtc.hits[hits[1]['HITId']]
+    counts = store.sync(mtc, rate=None)
+    assert (counts['checked'], counts['failed'], counts['inserted']) == (4, 1, 8)
+    assert list(counts['errors']) == [hits[1]['HITId']]
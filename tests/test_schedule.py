@@ -0,0 +1,82 @@
+import pytest
+
+from fake_mtc import FakeMTurkClient
+from helpers import get_hit_descriptions, get_hit_setups
+from journal import CreationJournal
+from post_hits import get_cost, get_hit_kwargs_builder
+from schedule_hits import SIMULATION_INFO, SIMULATION_SETUP, WaveScheduler
+
+SETUP_KWARGS = get_hit_setups(SIMULATION_SETUP)
+SET_COST = get_cost(SETUP_KWARGS, 1)['total_cost']
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = CreationJournal(str(tmp_path / 'demo.journal'), 'demo', 'lab', 'sandbox')
+    journal.start_run()
+    return journal
+
+
+def get_build_hit_kwargs(lifetime=3600):
+    build_hit_kwargs = get_hit_kwargs_builder('demo', get_hit_descriptions(SIMULATION_INFO), SETUP_KWARGS, [])
+    return lambda set_id: dict(build_hit_kwargs(set_id), LifetimeInSeconds=lifetime)
+
+
+def fill(mtc):
+    """ Submit every available assignment of every HIT. """
+    for HITId, hit in mtc.hits.items():
+        for _ in range(hit['NumberOfAssignmentsAvailable']):
+            mtc.add_assignment(HITId, 'W%s' % len(mtc.assignments[HITId]), status='Approved')
+
+
+def test_waves_stay_within_active_and_budget(journal):
+    mtc = FakeMTurkClient()
+    scheduler = WaveScheduler(mtc, journal, range(10), get_build_hit_kwargs(), SETUP_KWARGS,
+                              budget=5.5 * SET_COST, active=3, rate=None)
+
+    assert scheduler.step()['posted'] == 3
+    # the active sets take no workers yet, so nothing more is posted
+    assert scheduler.step()['posted'] == 0
+
+    fill(mtc)
+    summary = scheduler.step()
+    assert (summary['posted'], summary['left']) == (2, 5)
+    assert summary['committed'] == pytest.approx(5 * SET_COST)
+    assert not scheduler.is_done()
+
+    fill(mtc)
+    assert scheduler.step()['posted'] == 0
+    assert scheduler.is_done()
+    assert len(mtc.hits) == 5
+    assert [hit['SetId'] for hit in scheduler.created] == [0, 1, 2, 3, 4]
+
+
+def test_one_token_per_call(journal):
+    mtc = FakeMTurkClient()
+    scheduler = WaveScheduler(mtc, journal, range(4), get_build_hit_kwargs(), SETUP_KWARGS,
+                              budget=100., active=4, rate=None)
+    acquired = []
+    acquire = scheduler.limiter.acquire
+    scheduler.limiter.acquire = lambda: acquired.append(1) or acquire()
+
+    scheduler.step()
+    assert len(acquired) == mtc.calls['CreateHIT'] == 4
+    scheduler.step()
+    assert len(acquired) == mtc.calls['CreateHIT'] + mtc.calls['GetHIT'] == 8
+
+
+def test_extend_underfilled_hits(journal):
+    mtc = FakeMTurkClient()
+    # the HITs expire as soon as they are posted
+    scheduler = WaveScheduler(mtc, journal, range(2), get_build_hit_kwargs(lifetime=0), SETUP_KWARGS,
+                              budget=100., active=2, extend_hours=1., max_extensions=1, rate=None)
+    scheduler.step()
+
+    summary = scheduler.step()
+    assert summary['extended'] == 2
+    assert len(scheduler.index.get_active_hit_ids()) == 2
+
+    # once extended to their maximum, filled HITs are done
+    fill(mtc)
+    assert scheduler.step()['extended'] == 0
+    assert scheduler.is_done()
@@ -0,0 +1,50 @@
+import pytest
+
+from fake_mtc import FakeMTurkClient
+from helpers import HSetIdRange, register_mtc
+from post_hits import split_hit_set_ids, postShardedHITs
+
+
+def test_split_in_proportion_to_balances():
+    shards = split_hit_set_ids(HSetIdRange([(1, 20)]), dict(alvarezlab=300., konklab=100.), 1.)
+    assert [str(shard) for shard in shards.values()] == ['1-15', '16-20']
+
+
+def test_split_hands_out_remainders():
+    hit_set_ids = HSetIdRange([(1, 10), (21, 30)])
+    shards = split_hit_set_ids(hit_set_ids, dict(a=30., b=5., c=0.), 1.)
+    assert [len(shard) for shard in shards.values()] == [17, 3, 0]
+
+    # the shards are consecutive and cover every set once
+    assert [set_id for shard in shards.values() for set_id in shard] == list(hit_set_ids)
+
+
+def test_split_fills_the_accounts_that_can_pay():
+    shards = split_hit_set_ids(HSetIdRange([(1, 20)]), dict(a=10.5, b=10.5), 1.)
+    assert [len(shard) for shard in shards.values()] == [10, 10]
+
+
+def test_split_without_cost():
+    shards = split_hit_set_ids(HSetIdRange([(1, 7)]), dict(a=0., b=0.), 0.)
+    assert sorted(len(shard) for shard in shards.values()) == [3, 4]
+
+
+def test_split_beyond_the_balances():
+    with pytest.raises(RuntimeError):
+        split_hit_set_ids(HSetIdRange([(1, 20)]), dict(a=5., b=5.), 1.)
+
+
+def test_shard_with_a_qualification_of_the_first_account(make_project):
+    clients = dict(alvarezlab=FakeMTurkClient(balance='100'), konklab=FakeMTurkClient(balance='100'))
+    for account, mtc in clients.items():
+        register_mtc(account, 'formal', mtc)
+    # only the account that owns a qualification type can look it up
+    qt_id = clients['alvarezlab'].add_qualification_type('done before', ['W1', 'W2'])
+    make_project('demo', HSetId='1-10', extra_config='\n[EXCLUDE QUALIFICATION TYPE]\nid = %s\n' % qt_id)
+
+    HITIds = postShardedHITs('demo', list(clients), 'formal', use_cache=False)
+    assert {account: len(ids) for account, ids in HITIds.items()} == dict(alvarezlab=5, konklab=5)
+    assert clients['konklab'].calls['GetQualificationType'] == 0
+
+    # every shard has the same requirements, so the same HIT group
+    assert len({hit['HITGroupId'] for mtc in clients.values() for hit in mtc.hits.values()}) == 1
@@ -0,0 +1,228 @@
+"""
+    check the HIT.config of every project in the experiment tree
+"""
+
+import os
+import json
+import time
+import configparser
+
+from helpers import (set_logging_configs, read_config, get_hit_descriptions, get_hit_setups,
+                     get_hit_set_ids, get_qualification_requirements)
+from engine import run_concurrently
+from post_hits import WORK_PATH, LANDING_FILE, CONFIG_FILE
+
+
+CONFIG_INDEX_PATH = os.path.join(
+    os.path.expanduser('~'), '.cache', 'post_hits', 'config_index.json')
+# bump when the rules change, so that every project is checked again
+INDEX_VERSION = 1
+
+# the qualification sections and what postHITs makes of them
+QUALIFICATION_SECTIONS = {
+    'PERCENT APPROVED': 'percent_assignments_approved',
+    'NUM APPROVED': 'num_hit_approved',
+    'LOCATION': 'location',
+    'EXCLUDE QUALIFICATION TYPE': 'exclude_qualification_type',
+    'INCLUDE QUALIFICATION TYPE': 'include_qualification_type',
+    'TEST': 'include_qualification_type',
+}
+
+# the errors a broken config can raise while it is read, e.g. a bare % in a value
+CONFIG_ERRORS = (RuntimeError, configparser.Error, UnicodeDecodeError)
+
+
+def find_project_paths(experiments_path, experimenters=None):
+    """ The directories under experiments/<experimenter>/, hidden ones aside. """
+    if experimenters is None:
+        experimenters = sorted(entry.name for entry in os.scandir(experiments_path)
+                               if entry.is_dir() and not entry.name.startswith('.'))
+
+    def list_projects(experimenter):
+        experimenter_path = os.path.join(experiments_path, experimenter)
+        if not os.path.isdir(experimenter_path):
+            return []
+        return sorted(entry.path for entry in os.scandir(experimenter_path)
+                      if entry.is_dir() and not entry.name.startswith('.'))
+
+    # the experimenter directories are listed at once
+    return [path for _, paths in run_concurrently(list_projects, experimenters, max_workers=8)
+            for path in paths]
+
+
+def get_mtimes(project_path):
+    mtimes = {}
+    for file_name in (LANDING_FILE, CONFIG_FILE):
+        try:
+            mtimes[file_name] = os.stat(os.path.join(project_path, file_name)).st_mtime
+        except FileNotFoundError:
+            mtimes[file_name] = None
+    return mtimes
+
+
+def check_project(project_path):
+    """ Check a project with the rules of the posting path.
+
+    Returns:
+        result(dict): Every error found, and the title and number of sets
+            when the config could be read.
+    """
+    errors = []
+    result = dict(errors=errors)
+
+    landing_path = os.path.join(project_path, LANDING_FILE)
+    if not os.path.exists(landing_path):
+        errors.append('%s not found' % LANDING_FILE)
+    elif not os.path.getsize(landing_path):
+        errors.append('%s is empty' % LANDING_FILE)
+
+    if not os.path.exists(os.path.join(project_path, CONFIG_FILE)):
+        errors.append('%s not found' % CONFIG_FILE)
+        return result
+
+    try:
+        config = read_config(project_path, CONFIG_FILE)
+    except CONFIG_ERRORS as err:
+        errors.append(str(err))
+        return result
+
+    # run every check, so that all errors of the config are reported together
+    checks = [('INFO', get_hit_descriptions), ('SETUP', get_hit_setups)]
+    if config.has_section('HITSET'):
+        checks.append(('HITSET', get_hit_set_ids))
+    for section, qualification in QUALIFICATION_SECTIONS.items():
+        if config.has_section(section):
+            checks.append((section, lambda c, q=qualification: get_qualification_requirements(q, c)))
+
+    for section, check in checks:
+        try:
+            value = check(config[section])
+        except RuntimeError as err:
+            errors.append(str(err))
+        except CONFIG_ERRORS as err:
+            errors.append('CONFIG file %s cannot be read: %s' % (section, err))
+        else:
+            if section == 'INFO':
+                result['title'] = value['Title']
+            elif section == 'HITSET':
+                result['n_sets'] = len(value)
+    return result
+
+
+class ConfigIndex:
+    """ The check results of every project, keyed by path and kept with the
+    mtimes of its files, so that only changed projects are checked again.
+    """
+
+    def __init__(self, path=CONFIG_INDEX_PATH):
+        self.path = path
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        if index.get('version') != INDEX_VERSION:
+            return {}
+        return index['projects']
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(version=INDEX_VERSION, projects=self.entries), f)
+        os.replace(tmp_path, self.path)
+
+    def get(self, project_path, mtimes):
+        entry = self.entries.get(project_path)
+        if entry is not None and entry['mtimes'] == mtimes:
+            return entry
+
+    def set(self, project_path, mtimes, result):
+        self.entries[project_path] = dict(result, mtimes=mtimes, checked_at=time.time())
+        return self.entries[project_path]
+
+
+def validate_tree(work_path=WORK_PATH, experimenters=None, index=None, max_workers=16):
+    """ Check every project of the experiment tree.
+
+    The files of every project are stat'ed concurrently; projects whose
+    files did not change since the index last saw them are not read.
+
+    Returns:
+        results(dict): The check result of every project path.
+        counts(dict): The number of projects, and of those checked again.
+    """
+    project_paths = find_project_paths(os.path.join(work_path, 'experiments'), experimenters)
+
+    def validate(project_path):
+        mtimes = get_mtimes(project_path)
+        if not any(mtimes.values()):
+            # not a project
+            return None, False
+        entry = index.get(project_path, mtimes) if index is not None else None
+        if entry is not None:
+            return entry, False
+        result = check_project(project_path)
+        return (index.set(project_path, mtimes, result) if index is not None else result), True
+
+    results, counts = {}, dict(projects=0, checked=0)
+    for project_path, (result, checked) in run_concurrently(validate, project_paths,
+                                                            max_workers=max_workers):
+        if result is None:
+            continue
+        results[project_path] = result
+        counts['projects'] += 1
+        counts['checked'] += checked
+
+    if index is not None:
+        # forget the projects that are gone from the scanned experimenters
+        scanned = {os.path.dirname(path) for path in project_paths}
+        index.entries = {path: entry for path, entry in index.entries.items()
+                         if path in results or os.path.dirname(path) not in scanned}
+        index.save()
+    return results, counts
+
+
+def get_validation_review(results, counts):
+    failed = {path: result for path, result in results.items() if result['errors']}
+    review = ('\nConfig check\n' +
+              '  Projects : %d (%d checked, %d unchanged)\n' % (
+                  counts['projects'], counts['checked'], counts['projects'] - counts['checked']) +
+              '  Failed   : %d\n' % len(failed))
+    for path, result in sorted(failed.items()):
+        review += '\n  %s\n' % path
+        for error in result['errors']:
+            review += '    %s\n' % error
+    return review
+
+
+if __name__ == '__main__':
+    import argparse
+
+    # create parser object
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--work_path', type=str, default=WORK_PATH,
+                        help='Which directory holds the experiments tree?')
+    parser.add_argument('--experimenter', type=str, nargs='*',
+                        help='Which experimenters to check, all if not given?')
+    parser.add_argument('--no_cache', action='store_true',
+                        help='Check every project again instead of using the index?')
+    parser.add_argument('--workers', type=int, default=16,
+                        help='How many projects to check concurrently?')
+
+    # parse terminal inputs
+    args = parser.parse_args()
+
+    logger = set_logging_configs(__name__)
+    index = ConfigIndex()
+    if args.no_cache:
+        index.entries = {}
+    results, counts = validate_tree(args.work_path, args.experimenter, index=index,
+                                    max_workers=args.workers)
+    logger.info(get_validation_review(results, counts))
+
+    if any(result['errors'] for result in results.values()):
+        raise SystemExit(1)